@@ -1,4 +1,4 @@
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
 from flask_mail import Mail
 from flask_migrate import Migrate
@@ -13,58 +13,144 @@ from routes.forecasting_routes import init_forecasting_routes
 from routes.image_routes import init_image_routes
 from routes.csv_routes import init_csv_routes
 from routes.report_routes import init_report_routes
+from routes.forecast_cache import ForecastCache
+from routes.holt_winters import HoltWintersStore
+from routes.forecast_service import ForecastService
+from routes.report_pdf import ReportRenderer
+from routes.static_assets import StaticAssets
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
-
-# Flask Configurations
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = os.getenv('SQLALCHEMY_TRACK_MODIFICATIONS', 'False').lower() == 'true'
-app.config['SQLALCHEMY_ECHO'] = os.getenv('SQLALCHEMY_ECHO') == 'True'
-
-# Mail configuration
-app.config.update(
-    MAIL_SERVER=os.getenv('MAIL_SERVER'),
-    MAIL_PORT=int(os.getenv('MAIL_PORT', 587)),
-    MAIL_USERNAME=os.getenv('MAIL_USERNAME'),
-    MAIL_PASSWORD=os.getenv('MAIL_PASSWORD'),
-    MAIL_USE_TLS=os.getenv('MAIL_USE_TLS') == 'True',
-    MAIL_DEFAULT_SENDER=os.getenv('MAIL_DEFAULT_SENDER')
-)
-
-mail = Mail(app)
-bcrypt = Bcrypt(app)
-CORS(app, supports_credentials=True, resources={r"/*": {"origins": "*"}})
-
-# Initialize PostgreSQL database and migration
-db.init_app(app)
-migrate = Migrate(app, db)
-
-# Automatically create the database if not already created
-with app.app_context():
-    db.create_all()  # This will create all tables based on the models if they don't exist already
-
-    # Seed the database with disease data
-    DiseaseInfo.seed()
-
-# Serve frontend
-website_folder = os.path.join(os.getcwd(), "..", "frontend", "build")
-@app.route("/", defaults={"filename": ""})
-@app.route("/<path:filename>")
-def index(filename):
-    if not filename:
-        filename = "index.html"
-    return send_from_directory(website_folder, filename)
-
-# Initialize routes
-init_user_routes(app, mail)
-init_forecasting_routes(app)
-init_image_routes(app)
-init_csv_routes(app)
-init_report_routes(app)
+
+def create_app():
+    app = Flask(__name__)
+
+    # Flask Configurations
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = os.getenv('SQLALCHEMY_TRACK_MODIFICATIONS', 'False').lower() == 'true'
+    app.config['SQLALCHEMY_ECHO'] = os.getenv('SQLALCHEMY_ECHO') == 'True'
+
+    # Mail configuration
+    app.config.update(
+        MAIL_SERVER=os.getenv('MAIL_SERVER'),
+        MAIL_PORT=int(os.getenv('MAIL_PORT', 587)),
+        MAIL_USERNAME=os.getenv('MAIL_USERNAME'),
+        MAIL_PASSWORD=os.getenv('MAIL_PASSWORD'),
+        MAIL_USE_TLS=os.getenv('MAIL_USE_TLS') == 'True',
+        MAIL_DEFAULT_SENDER=os.getenv('MAIL_DEFAULT_SENDER')
+    )
+
+    # Outbound mail queue (MAIL_QUEUE_SENDER=False leaves sending to `flask send-queued-mail`)
+    app.config.update(
+        MAIL_QUEUE_SENDER=os.getenv('MAIL_QUEUE_SENDER', 'True').lower() == 'true',
+        MAIL_QUEUE_POLL_SECONDS=float(os.getenv('MAIL_QUEUE_POLL_SECONDS', 2.0)),
+        MAIL_QUEUE_BATCH_SIZE=int(os.getenv('MAIL_QUEUE_BATCH_SIZE', 20)),
+        MAIL_QUEUE_MAX_ATTEMPTS=int(os.getenv('MAIL_QUEUE_MAX_ATTEMPTS', 5)),
+        MAIL_QUEUE_BACKOFF_SECONDS=float(os.getenv('MAIL_QUEUE_BACKOFF_SECONDS', 30))
+    )
+
+    # Inference configuration
+    app.config.update(
+        MODEL_PATH=os.getenv('MODEL_PATH', 'saved_models/CacaoScanner_best_v1.h5'),
+        INFERENCE_BACKEND=os.getenv('INFERENCE_BACKEND', 'keras'),  # keras, tflite or onnx (see convert_model.py)
+        INFERENCE_THREADS=int(os.getenv('INFERENCE_THREADS', 0)) or None,
+        SCANNER_READY_TIMEOUT=float(os.getenv('SCANNER_READY_TIMEOUT', 30)),  # Seconds a scan waits for the model to warm up
+        SCANNER_RETRY_SECONDS=float(os.getenv('SCANNER_RETRY_SECONDS', 30)),  # Wait before reloading a model that failed to load (doubles per failure)
+        MODEL_SERVER_SOCKET=os.getenv('MODEL_SERVER_SOCKET'),  # Use the shared model server when set
+        INFERENCE_MAX_BATCH_SIZE=int(os.getenv('INFERENCE_MAX_BATCH_SIZE', 8)),
+        INFERENCE_MAX_WAIT_MS=float(os.getenv('INFERENCE_MAX_WAIT_MS', 10)),
+        INFERENCE_QUEUE_DEPTH=int(os.getenv('INFERENCE_QUEUE_DEPTH', 64)),
+        PREDICTION_CACHE_SIZE=int(os.getenv('PREDICTION_CACHE_SIZE', 1024)),
+        PREDICTION_CACHE_TTL=int(os.getenv('PREDICTION_CACHE_TTL', 3600)),
+        SCAN_STORE_DIR=os.getenv('SCAN_STORE_DIR', 'uploads/scanned_images'),
+        BULK_SCAN_MAX_IMAGES=int(os.getenv('BULK_SCAN_MAX_IMAGES', 200)),
+        MAX_IMAGE_BYTES=int(os.getenv('MAX_IMAGE_BYTES', 20 * 1024 * 1024))
+    )
+
+    # Forecast cache shared by all workers on this host
+    app.config['FORECAST_CACHE_DIR'] = os.getenv('FORECAST_CACHE_DIR', 'cache/forecasts')
+    app.config['FORECAST_MODEL_DIR'] = os.getenv('FORECAST_MODEL_DIR', 'cache/models')
+    app.config['FORECAST_CV_METHOD'] = os.getenv('FORECAST_CV_METHOD', 'kfold')  # kfold or walk_forward
+
+    # Rendered report PDFs, cached per series, data version and severity
+    app.config.update(
+        REPORT_CACHE_DIR=os.getenv('REPORT_CACHE_DIR', 'cache/reports'),
+        REPORT_PDF_WORKERS=int(os.getenv('REPORT_PDF_WORKERS', 2)),
+        REPORT_PDF_TIMEOUT=float(os.getenv('REPORT_PDF_TIMEOUT', 60))  # Seconds a download waits for the render
+    )
+
+    # Password hashing (bcrypt cost; stored hashes are upgraded on the next login)
+    app.config.update(
+        BCRYPT_LOG_ROUNDS=int(os.getenv('BCRYPT_LOG_ROUNDS', 12)),
+        PASSWORD_HASH_WORKERS=int(os.getenv('PASSWORD_HASH_WORKERS', 0)) or None,  # Defaults to half the cores
+        PASSWORD_HASH_QUEUE_DEPTH=int(os.getenv('PASSWORD_HASH_QUEUE_DEPTH', 32))
+    )
+
+    # Streaming CSV imports (?mode=stream on /api/upload_csv)
+    app.config['CSV_SPOOL_DIR'] = os.getenv('CSV_SPOOL_DIR', 'cache/csv_imports')
+    app.config['CSV_CHUNK_ROWS'] = int(os.getenv('CSV_CHUNK_ROWS', 50000))
+
+    # Asynchronous scan job workers (0 disables them in this process)
+    app.config.update(
+        SCAN_JOB_WORKERS=int(os.getenv('SCAN_JOB_WORKERS', 2)),
+        SCAN_JOB_POLL_SECONDS=float(os.getenv('SCAN_JOB_POLL_SECONDS', 1.0)),
+        SCAN_JOB_MAX_ATTEMPTS=int(os.getenv('SCAN_JOB_MAX_ATTEMPTS', 3)),
+        SCAN_JOB_STALE_SECONDS=int(os.getenv('SCAN_JOB_STALE_SECONDS', 300)),
+        SCAN_JOB_RETRY_SECONDS=float(os.getenv('SCAN_JOB_RETRY_SECONDS', 10))  # Delay before retrying a job while the scanner is busy or loading
+    )
+
+    mail = Mail(app)
+    bcrypt = Bcrypt(app)
+    CORS(app, supports_credentials=True, resources={r"/*": {"origins": "*"}})
+
+    # Initialize PostgreSQL database and migration
+    db.init_app(app)
+    migrate = Migrate(app, db)
+
+    # Automatically create the database if not already created
+    # (set DB_BOOTSTRAP=False when the schema is managed with `flask db upgrade`)
+    if os.getenv('DB_BOOTSTRAP', 'True').lower() == 'true':
+        with app.app_context():
+            db.create_all()  # This will create all tables based on the models if they don't exist already
+
+            # Seed the database with disease data
+            DiseaseInfo.seed()
+
+    # Serve frontend
+    website_folder = os.getenv('STATIC_BUILD_DIR', os.path.join(os.getcwd(), "..", "frontend", "build"))
+    # ETags are computed here once; run precompress_static.py after each build for the .br/.gz variants
+    static_assets = StaticAssets(website_folder)
+    @app.route("/", defaults={"filename": ""})
+    @app.route("/<path:filename>")
+    def index(filename):
+        if not filename:
+            filename = "index.html"
+        return static_assets.serve(filename)
+
+    # Initialize routes
+    init_user_routes(app, mail)
+    forecast_cache = ForecastCache(app.config['FORECAST_CACHE_DIR'])
+    model_store = HoltWintersStore(app.config['FORECAST_MODEL_DIR'])
+    forecast_service = ForecastService(app, forecast_cache, model_store)
+    init_forecasting_routes(app, forecast_service)
+    init_image_routes(app)
+    init_csv_routes(app, forecast_cache, model_store)
+    report_renderer = ReportRenderer(
+        app.config['REPORT_CACHE_DIR'],
+        workers=app.config['REPORT_PDF_WORKERS'],
+        timeout=app.config['REPORT_PDF_TIMEOUT']
+    )
+    init_report_routes(app, forecast_service, report_renderer)
+
+    return app
+
+
+# Forecast and report pool children import this file as `__mp_main__`; they
+# only need the route modules, not a second app with its database bootstrap
+if __name__ != "__mp_main__":
+    app = create_app()
 
 if __name__ == "__main__":
     app.run(host='0.0.0.0', port=5000, debug=True)
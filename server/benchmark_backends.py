@@ -0,0 +1,144 @@
+"""Accuracy parity and performance check for the inference backends.
+
+    python benchmark_backends.py --samples samples/ \\
+        --backend keras=saved_models/CacaoScanner_best_v1.h5 \\
+        --backend tflite=saved_models/CacaoScanner_best_v1_int8.tflite
+
+Each backend runs in its own process so the reported resident memory is not
+polluted by the others. The first Keras backend is the parity reference.
+"""
+import argparse
+import multiprocessing
+import queue
+import sys
+import time
+
+import numpy as np
+
+from routes.image_pipeline import decode_image, preprocess_input
+from routes.inference import CLASS_NAMES
+from routes.inference_backends import BACKENDS, load_backend, load_labelled_samples
+
+
+def resident_memory_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_samples(samples_dir):
+    images, labels = [], []
+    for file_path, label in load_labelled_samples(samples_dir):
+        with open(file_path, "rb") as f:
+            images.append(decode_image(f.read(), preprocess_input, out=np.empty((224, 224, 3), dtype=np.float32)))
+        labels.append(label)
+    return np.stack(images).astype(np.float32), np.array(labels)
+
+
+def run_backend(kind, model_path, samples_dir, batch_size, warmup, results):
+    images, _ = load_samples(samples_dir)
+    rss_before = resident_memory_mb()
+    started = time.perf_counter()
+    backend = load_backend(kind, model_path)
+    load_seconds = time.perf_counter() - started
+
+    for _ in range(warmup):
+        backend.predict(images[:batch_size])
+
+    outputs, latencies = [], []
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        started = time.perf_counter()
+        outputs.append(np.asarray(backend.predict(batch)))
+        latencies.append((time.perf_counter() - started) * 1000 / len(batch))
+
+    results.put({
+        "outputs": np.concatenate(outputs),
+        "load_seconds": load_seconds,
+        "latency_p50_ms": float(np.percentile(latencies, 50)),
+        "latency_p95_ms": float(np.percentile(latencies, 95)),
+        "model_rss_mb": resident_memory_mb() - rss_before,
+        "peak_rss_mb": resident_memory_mb(),
+    })
+
+
+def benchmark(kind, model_path, samples_dir, batch_size, warmup, timeout):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=run_backend, args=(kind, model_path, samples_dir, batch_size, warmup, results))
+    process.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                return results.get(timeout=1.0)
+            except queue.Empty:
+                # A crashed child (e.g. killed while loading the model) never reports back
+                if not process.is_alive():
+                    raise RuntimeError(f"backend process exited with code {process.exitcode}")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"no result after {timeout:.0f}s")
+    finally:
+        if process.is_alive() and time.monotonic() > deadline:
+            process.terminate()
+        process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare CacaoScanner inference backends.")
+    parser.add_argument("--samples", required=True, help="Folder of labelled images, one subfolder per class")
+    parser.add_argument("--backend", action="append", required=True, help="kind=path, kind is one of " + ", ".join(BACKENDS))
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for each backend")
+    parser.add_argument("--min-agreement", type=float, default=0.99, help="Minimum top-1 agreement with the Keras reference")
+    args = parser.parse_args()
+
+    try:
+        _, labels = load_samples(args.samples)
+    except ValueError as e:
+        parser.error(str(e))
+    if not len(labels):
+        parser.error(f"No labelled images found under {args.samples}")
+
+    class_names = np.array(CLASS_NAMES)
+    reference = None
+    failed = False
+    print(f"{'backend':<40} {'acc':>6} {'agree':>6} {'max|dp|':>8} {'p50 ms':>8} {'p95 ms':>8} {'model MB':>9} {'RSS MB':>8}")
+    for spec in args.backend:
+        kind, _, model_path = spec.partition("=")
+        try:
+            result = benchmark(kind, model_path, args.samples, args.batch_size, args.warmup, args.timeout)
+        except RuntimeError as e:
+            print(f"{spec:<40} failed: {e}")
+            failed = True
+            continue
+        # Compare the class names users see, the two "N/A" outputs are the same answer
+        predicted = class_names[result["outputs"].argmax(axis=1)]
+        if reference is None and kind == "keras":
+            reference = result["outputs"]
+
+        accuracy = float(np.mean(predicted == class_names[labels]))
+        agreement, max_diff = float("nan"), float("nan")
+        if reference is not None:
+            agreement = float(np.mean(predicted == class_names[reference.argmax(axis=1)]))
+            max_diff = float(np.max(np.abs(result["outputs"] - reference)))
+            failed = failed or agreement < args.min_agreement
+
+        print(f"{spec:<40} {accuracy:>6.3f} {agreement:>6.3f} {max_diff:>8.4f} "
+              f"{result['latency_p50_ms']:>8.2f} {result['latency_p95_ms']:>8.2f} "
+              f"{result['model_rss_mb']:>9.1f} {result['peak_rss_mb']:>8.1f}")
+
+    if failed:
+        print(f"Parity check failed: a backend failed or top-1 agreement is below {args.min_agreement}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
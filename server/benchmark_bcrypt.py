@@ -0,0 +1,62 @@
+"""Login throughput for each bcrypt cost factor.
+
+    python benchmark_bcrypt.py --rounds 10 11 12 13 --threads 4
+
+Reports password checks per second on one core and on the PasswordHasher
+pool, to help pick BCRYPT_LOG_ROUNDS and PASSWORD_HASH_WORKERS.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from routes.password_hasher import PasswordHasher
+
+
+def checks_per_second(check, hashed, seconds):
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        check(hashed, "correct horse battery staple")
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def pool_checks_per_second(hasher, hashed, seconds, clients):
+    deadline = time.perf_counter() + seconds
+
+    def client(_):
+        count = 0
+        while time.perf_counter() < deadline:
+            hasher.check(hashed, "correct horse battery staple")
+            count += 1
+        return count
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        total = sum(executor.map(client, range(clients)))
+    return total / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bcrypt cost factors.")
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--threads", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="PasswordHasher workers")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Measurement time per setting")
+    args = parser.parse_args()
+
+    print(f"{'rounds':>6} {'ms/check':>9} {'logins/s/core':>14} {'pool logins/s':>14} {'per worker':>11}")
+    for rounds in args.rounds:
+        hashed = bcrypt.hashpw(b"correct horse battery staple", bcrypt.gensalt(rounds)).decode("utf-8")
+        single = checks_per_second(lambda h, p: bcrypt.checkpw(p.encode("utf-8"), h.encode("utf-8")), hashed, args.seconds)
+
+        hasher = PasswordHasher(rounds=rounds, workers=args.threads, queue_depth=args.threads * 4)
+        pooled = pool_checks_per_second(hasher, hashed, args.seconds, clients=args.threads * 2)
+
+        print(f"{rounds:>6} {1000 / single:>9.1f} {single:>14.1f} {pooled:>14.1f} {pooled / args.threads:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
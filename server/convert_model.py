@@ -0,0 +1,82 @@
+"""Export the CacaoScanner Keras model to a lighter CPU inference artifact.
+
+    python convert_model.py --format tflite-float16
+    python convert_model.py --format tflite-int8 --calibration-dir samples/
+    python convert_model.py --format onnx
+
+Serve the result with INFERENCE_BACKEND=tflite|onnx and MODEL_PATH pointing at
+the exported file.
+"""
+import argparse
+import itertools
+import os
+
+import numpy as np
+
+from routes.image_pipeline import decode_image, preprocess_input
+from routes.inference import DEFAULT_MODEL_PATH, load_scanner_model
+from routes.inference_backends import load_labelled_samples
+
+FORMATS = ("tflite-float16", "tflite-int8", "onnx")
+
+
+def representative_dataset(calibration_dir, limit):
+    def generator():
+        for file_path, _ in itertools.islice(load_labelled_samples(calibration_dir), limit):
+            with open(file_path, "rb") as f:
+                image = decode_image(f.read(), preprocess_input, out=np.empty((224, 224, 3), dtype=np.float32))
+            yield [np.expand_dims(image, 0).astype(np.float32)]
+
+    return generator
+
+
+def convert_tflite(model, quantization, calibration_dir=None, calibration_limit=200):
+    import tensorflow as tf # type: ignore
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif calibration_dir:
+        # Full integer weights and activations; inputs and outputs stay float32
+        converter.representative_dataset = representative_dataset(calibration_dir, calibration_limit)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    # Without calibration images int8 falls back to dynamic-range quantization
+    return converter.convert()
+
+
+def convert_onnx(model, output_path, opset=13):
+    import tensorflow as tf # type: ignore
+    import tf2onnx # type: ignore
+
+    spec = (tf.TensorSpec((None, 224, 224, 3), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=output_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the CacaoScanner model for TFLite or ONNX inference.")
+    parser.add_argument("--format", choices=FORMATS, required=True)
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--output", help="Output path (defaults next to the Keras model)")
+    parser.add_argument("--calibration-dir", help="Labelled sample folders used to calibrate int8 quantization")
+    parser.add_argument("--calibration-limit", type=int, default=200)
+    args = parser.parse_args()
+
+    base, _ = os.path.splitext(args.model)
+    suffix = {"tflite-float16": "_float16.tflite", "tflite-int8": "_int8.tflite", "onnx": ".onnx"}[args.format]
+    output_path = args.output or base + suffix
+
+    model = load_scanner_model(args.model)
+    if args.format == "onnx":
+        convert_onnx(model, output_path)
+    else:
+        quantization = args.format.split("-", 1)[1]
+        artifact = convert_tflite(model, quantization, args.calibration_dir, args.calibration_limit)
+        with open(output_path, "wb") as f:
+            f.write(artifact)
+
+    print(f"Wrote {output_path} ({os.path.getsize(output_path) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Local inference daemon that owns the CacaoScanner model.
+
+Run one instance per host and point the Flask workers at it with
+MODEL_SERVER_SOCKET so they share a single copy of the model:
+
+    python model_server.py --socket /tmp/leafscan-model.sock
+"""
+import argparse
+import logging
+import os
+import socketserver
+
+from dotenv import load_dotenv
+
+from routes.image_pipeline import IMAGE_SIZE
+from routes.inference import DEFAULT_MODEL_PATH, BatchScheduler, SchedulerBusy
+from routes.inference_backends import BACKENDS, load_backend
+from routes.model_client import recv_message, send_message
+
+logger = logging.getLogger("model_server")
+
+INPUT_SHAPE = IMAGE_SIZE + (3,)
+
+
+class ModelRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        scheduler = self.server.scheduler
+        while True:
+            try:
+                header, array = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+
+            try:
+                if header.get("op") == "health":
+                    send_message(self.request, {"ok": True, "status": "ready", "backend": self.server.backend_kind, **scheduler.stats()})
+                elif header.get("op") == "predict" and array is not None:
+                    if array.ndim != 4 or tuple(array.shape[1:]) != INPUT_SHAPE:
+                        send_message(self.request, {"ok": False, "code": "bad_request", "error": f"Expected images of shape {INPUT_SHAPE}, got {tuple(array.shape[1:])}"})
+                        continue
+                    prediction, queue_wait_ms = scheduler.predict_batch(array)
+                    send_message(self.request, {"ok": True, "queue_wait_ms": queue_wait_ms}, prediction)
+                else:
+                    send_message(self.request, {"ok": False, "code": "bad_request", "error": "Unknown request"})
+            except SchedulerBusy as e:
+                send_message(self.request, {"ok": False, "code": "busy", "error": str(e)})
+            except Exception as e:
+                logger.exception("Inference failed")
+                send_message(self.request, {"ok": False, "code": "inference_error", "error": str(e)})
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, scheduler, backend_kind):
+        self.scheduler = scheduler
+        self.backend_kind = backend_kind
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, ModelRequestHandler)
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Serve the CacaoScanner model over a Unix socket.")
+    parser.add_argument("--socket", default=os.getenv("MODEL_SERVER_SOCKET", "/tmp/leafscan-model.sock"))
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH", DEFAULT_MODEL_PATH))
+    parser.add_argument("--backend", choices=BACKENDS, default=os.getenv("INFERENCE_BACKEND", "keras"))
+    parser.add_argument("--threads", type=int, default=int(os.getenv("INFERENCE_THREADS", 0)) or None)
+    parser.add_argument("--max-batch-size", type=int, default=int(os.getenv("INFERENCE_MAX_BATCH_SIZE", 8)))
+    parser.add_argument("--max-wait-ms", type=float, default=float(os.getenv("INFERENCE_MAX_WAIT_MS", 10)))
+    parser.add_argument("--queue-depth", type=int, default=int(os.getenv("INFERENCE_QUEUE_DEPTH", 64)))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    backend = load_backend(args.backend, args.model, args.threads)
+    scheduler = BatchScheduler(
+        backend.predict,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        queue_depth=args.queue_depth
+    )
+
+    with ModelServer(args.socket, scheduler, args.backend) as server:
+        logger.info("Model server listening on %s", args.socket)
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
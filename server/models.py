@@ -1,5 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from uuid import uuid4
+import csv
+import io
+import json
 import re
 from werkzeug.security import generate_password_hash
 from datetime import datetime
@@ -47,23 +51,366 @@ class ScanRecord(db.Model):
     disease = db.Column(db.String(100), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)  # Timestamp when scan is created
 
-    user = db.relationship('User', backref=db.backref('scans', lazy=True))  # Relationship to track user
+    # passive_deletes: scans go with the user through ON DELETE CASCADE instead of being orphaned
+    user = db.relationship('User', backref=db.backref('scans', lazy=True, passive_deletes=True))  # Relationship to track user
+    # Disease text for the predicted class, matched by name (read-only, no foreign key)
+    disease_info = db.relationship(
+        'DiseaseInfo',
+        primaryjoin='foreign(ScanRecord.disease) == DiseaseInfo.name',
+        viewonly=True,
+        uselist=False
+    )
+
+    __table_args__ = (
+        # Scan history pages: WHERE user_id = ? AND (created_at, id) < cursor ORDER BY created_at DESC, id DESC
+        db.Index('ix_scan_records_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "disease": self.disease,
+            "image_path": self.image_path,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "disease_info": self.disease_info.to_dict() if self.disease_info else None
+        }
+
+# Scan statistics rollups, updated in the same transaction as each ScanRecord insert
+class ScanDiseaseCount(db.Model):
+    __tablename__ = 'scan_disease_counts'
+    disease = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+
+class ScanUserCount(db.Model):
+    __tablename__ = 'scan_user_counts'
+    user_id = db.Column(db.String(32), db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+
+class ScanDailyCount(db.Model):
+    __tablename__ = 'scan_daily_counts'
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.String(32), primary_key=True, default='')  # '' for anonymous scans
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+
+def _increment_counts(model, key_columns, counts):
+    """Upsert `count = count + n` for each key in `counts`."""
+    if not counts:
+        return
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    table = model.__table__
+    # Sorted keys keep row lock order stable between concurrent transactions
+    rows = [dict(zip(key_columns, key), count=n) for key, n in sorted(counts.items())]
+    stmt = insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={'count': table.c.count + stmt.excluded.count}
+    )
+    db.session.execute(stmt)
+
+def record_scan_rollups(scans):
+    """Add scans, given as (user_id, disease, created_at) tuples, to the rollup tables.
+
+    Call before committing the session that inserts the matching ScanRecord rows.
+    """
+    by_disease, by_user, by_day = {}, {}, {}
+    for user_id, disease, created_at in scans:
+        by_disease[(disease,)] = by_disease.get((disease,), 0) + 1
+        if user_id:
+            by_user[(user_id,)] = by_user.get((user_id,), 0) + 1
+        day_key = (created_at.date(), user_id or '')
+        by_day[day_key] = by_day.get(day_key, 0) + 1
+
+    _increment_counts(ScanDiseaseCount, ['disease'], by_disease)
+    _increment_counts(ScanUserCount, ['user_id'], by_user)
+    _increment_counts(ScanDailyCount, ['day', 'user_id'], by_day)
+
+def discount_user_scans(connection, user_id):
+    """Subtract a user's scans from the disease and daily rollups.
+
+    Runs before a User is deleted through the ORM, as the database cascade
+    removes their scan_records without touching the rollups (their
+    scan_user_counts row cascades on its own). Deletes that bypass the ORM
+    need `flask backfill-scan-rollups` afterwards to reconcile the counts.
+    """
+    count = db.func.count(ScanRecord.id)
+    day = db.func.date(ScanRecord.created_at)
+    by_disease = connection.execute(
+        db.select(ScanRecord.disease, count).where(ScanRecord.user_id == user_id).group_by(ScanRecord.disease)
+    ).all()
+    by_day = connection.execute(
+        db.select(day, count)
+        .where(ScanRecord.user_id == user_id, ScanRecord.created_at.isnot(None))
+        .group_by(day)
+    ).all()
+
+    # Same lock order as _increment_counts
+    for disease, n in sorted(by_disease):
+        connection.execute(
+            db.update(ScanDiseaseCount).where(ScanDiseaseCount.disease == disease).values(count=ScanDiseaseCount.count - n)
+        )
+    for scan_day, n in sorted(by_day):
+        connection.execute(
+            db.update(ScanDailyCount)
+            .where(ScanDailyCount.day == scan_day, ScanDailyCount.user_id == user_id)
+            .values(count=ScanDailyCount.count - n)
+        )
+    connection.execute(db.delete(ScanDiseaseCount).where(ScanDiseaseCount.count <= 0))
+    connection.execute(db.delete(ScanDailyCount).where(ScanDailyCount.user_id == user_id, ScanDailyCount.count <= 0))
+
+@event.listens_for(User, 'before_delete')
+def _discount_deleted_user_scans(mapper, connection, user):
+    discount_user_scans(connection, user.id)
+
+def backfill_scan_rollups():
+    """Rebuild the rollup tables from scan_records in one transaction."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # Block new scans until the rebuilt counters are committed
+        db.session.execute(db.text('LOCK TABLE scan_records IN SHARE MODE'))
+
+    for model in (ScanDiseaseCount, ScanUserCount, ScanDailyCount):
+        db.session.query(model).delete()
+
+    count = db.func.count(ScanRecord.id)
+    day = db.func.date(ScanRecord.created_at)
+    user_key = db.func.coalesce(ScanRecord.user_id, '')
+    db.session.execute(db.insert(ScanDiseaseCount).from_select(
+        ['disease', 'count'],
+        db.select(ScanRecord.disease, count).group_by(ScanRecord.disease)
+    ))
+    db.session.execute(db.insert(ScanUserCount).from_select(
+        ['user_id', 'count'],
+        db.select(ScanRecord.user_id, count).where(ScanRecord.user_id.isnot(None)).group_by(ScanRecord.user_id)
+    ))
+    db.session.execute(db.insert(ScanDailyCount).from_select(
+        ['day', 'user_id', 'count'],
+        db.select(day, user_key, count).where(ScanRecord.created_at.isnot(None)).group_by(day, user_key)
+    ))
+    db.session.commit()
+
+# Scan Job Table (asynchronous scans)
+class ScanJob(db.Model):
+    __tablename__ = 'scan_jobs'
+    id = db.Column(db.String(32), primary_key=True, unique=True, default=get_uuid)
+    user_id = db.Column(db.String(32), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True)
+    image_path = db.Column(db.String(255), nullable=False)
+    image_hash = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    result = db.Column(db.Text, nullable=True)  # JSON encoded scan result
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)  # Set when deferred while the scanner is unavailable
+    worker_id = db.Column(db.String(64), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)  # Heartbeat while running
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_scan_jobs_status_created_at', 'status', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "result": json.loads(self.result) if self.result else None,
+            "error": self.error,
+            "attempts": self.attempts,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+# Outbound Email Table (sent in the background by routes/mail_queue.py)
+class OutboundEmail(db.Model):
+    __tablename__ = 'outbound_emails'
+    id = db.Column(db.String(32), primary_key=True, unique=True, default=get_uuid)
+    sender = db.Column(db.String(255), nullable=True)
+    recipients = db.Column(db.Text, nullable=False)  # JSON encoded list of addresses
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=True)  # Cleared once sent (may hold codes or passwords)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_outbound_emails_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
 
 # Production Table
+DEFAULT_SERIES = 'default'
+SERIES_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,100}$')  # Farm or region ids, also used in cache file names
+
 class Production(db.Model):
     __tablename__ = 'production'
     id = db.Column(db.Integer, primary_key=True)
+    series_id = db.Column(db.String(100), nullable=False, default=DEFAULT_SERIES, server_default=DEFAULT_SERIES)
     date = db.Column(db.Date)
     value = db.Column(db.Float)  # Adjust the column names and types as needed
 
-    def __init__(self, date, value):
+    __table_args__ = (
+        db.Index('ux_production_series_date', 'series_id', 'date', unique=True),
+    )
+
+    def __init__(self, date, value, series_id=DEFAULT_SERIES):
+        self.series_id = series_id
         self.date = date
         self.value = value
 
     def __repr__(self):
-        return f'<Production {self.date} - {self.value}>'
+        return f'<Production {self.series_id} {self.date} - {self.value}>'
+
+def production_version_name(series_id=DEFAULT_SERIES):
+    """DataVersion name of one production series."""
+    return f'production:{series_id}'
+
+def copy_rows(table, columns, rows):
+    """Bulk load `rows` (tuples in `columns` order) in the current transaction.
+
+    Postgres gets a single COPY ... FROM STDIN; other databases an executemany.
+    """
+    if not rows:
+        return
+    if db.session.get_bind().dialect.name == 'postgresql':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        # Same DBAPI connection as the session, so the COPY joins its transaction
+        cursor = db.session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+    else:
+        db.session.execute(db.insert(table), [dict(zip(columns, row)) for row in rows])
+
+def replace_production(rows, series_id=DEFAULT_SERIES):
+    """Swap one series for (date, value) rows in one transaction.
+
+    Readers keep seeing the old rows until the commit; concurrent uploads wait.
+    """
+    lock_production()
+    db.session.execute(db.delete(Production).where(Production.series_id == series_id))
+    copy_rows(Production.__table__, ('series_id', 'date', 'value'), [(series_id, date, value) for date, value in rows])
+
+def update_production_values(rows, series_id=DEFAULT_SERIES):
+    """Set the value of existing (date, value) rows of a series with one executemany."""
+    if rows:
+        table = Production.__table__
+        db.session.execute(
+            db.update(table)
+            .where(table.c.series_id == series_id, table.c.date == db.bindparam('b_date'))
+            .values(value=db.bindparam('b_value')),
+            [{'b_date': date, 'b_value': value} for date, value in rows]
+        )
+
+def lock_production():
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # EXCLUSIVE still allows plain SELECTs but serializes writers
+        db.session.execute(db.text('LOCK TABLE production IN EXCLUSIVE MODE'))
+
+# CSV Import Table (resumable streaming uploads, keyed by file checksum)
+class CsvImport(db.Model):
+    __tablename__ = 'csv_imports'
+    checksum = db.Column(db.String(64), primary_key=True)  # SHA-256 of the uploaded file
+    series_id = db.Column(db.String(100), nullable=False, default=DEFAULT_SERIES, server_default=DEFAULT_SERIES)
+    filename = db.Column(db.String(255), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='loading')  # loading, done, failed
+    bytes_total = db.Column(db.BigInteger, nullable=False, default=0)
+    chunks_done = db.Column(db.Integer, nullable=False, default=0)
+    chunk_rows = db.Column(db.Integer, nullable=True)  # CSV_CHUNK_ROWS the chunks were staged with
+    rows_loaded = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)  # JSON encoded list of invalid rows, or a message
+    data_version = db.Column(db.Integer, nullable=True)  # Production version this import produced
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        try:
+            error = json.loads(self.error) if self.error else None
+        except ValueError:
+            error = self.error
+        return {
+            "checksum": self.checksum,
+            "series_id": self.series_id,
+            "filename": self.filename,
+            "status": self.status,
+            "bytes_total": self.bytes_total,
+            "chunks_done": self.chunks_done,
+            "chunk_rows": self.chunk_rows,
+            "rows_loaded": self.rows_loaded,
+            "error": error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+# Staging rows of an in-progress CSV import
+class ProductionImportRow(db.Model):
+    __tablename__ = 'production_import_rows'
+    id = db.Column(db.Integer, primary_key=True)
+    checksum = db.Column(db.String(64), db.ForeignKey('csv_imports.checksum', ondelete='CASCADE'), nullable=False)
+    chunk = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    value = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_production_import_rows_checksum_chunk', 'checksum', 'chunk'),
+    )
+
+def duplicate_import_dates(checksum, limit=1000):
+    """Dates staged more than once by an import (they would break ux_production_series_date)."""
+    return db.session.execute(
+        db.select(ProductionImportRow.date)
+        .where(ProductionImportRow.checksum == checksum)
+        .group_by(ProductionImportRow.date)
+        .having(db.func.count() > 1)
+        .order_by(ProductionImportRow.date)
+        .limit(limit)
+    ).scalars().all()
+
+def swap_in_production_import(checksum, series_id=DEFAULT_SERIES):
+    """Replace a series with an import's staged rows in the current transaction."""
+    lock_production()
+    db.session.execute(db.delete(Production).where(Production.series_id == series_id))
+    db.session.execute(db.insert(Production).from_select(
+        ['series_id', 'date', 'value'],
+        db.select(db.literal(series_id), ProductionImportRow.date, ProductionImportRow.value)
+        .where(ProductionImportRow.checksum == checksum)
+        .order_by(ProductionImportRow.chunk, ProductionImportRow.id)
+    ))
+    db.session.execute(db.delete(ProductionImportRow).where(ProductionImportRow.checksum == checksum))
     
+# Data Version Table (change stamps used to key caches shared across workers)
+class DataVersion(db.Model):
+    __tablename__ = 'data_versions'
+    name = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+def get_data_version(name):
+    """Return the current version stamp of a dataset (0 if it was never bumped)."""
+    row = db.session.get(DataVersion, name)
+    return row.version if row else 0
+
+def bump_data_version(name):
+    """Increment a dataset's version in the current transaction."""
+    row = db.session.get(DataVersion, name, with_for_update=True)
+    if row is None:
+        row = DataVersion(name=name, version=0)
+        db.session.add(row)
+    row.version += 1
+    return row.version
+
 # Disease Info Table    
+DISEASE_INFO_VERSION = 'disease_info'  # Bumped on every write so worker caches reload
+
 class DiseaseInfo(db.Model):
     __tablename__ = "disease_info"
 
@@ -114,9 +461,11 @@ class DiseaseInfo(db.Model):
         }
 
         # Add each disease data to the table
+        added = False
         for name, data in diseases_data.items():
             disease = DiseaseInfo.query.filter_by(name=name).first()
             if not disease:
+                added = True
                 disease = DiseaseInfo(
                     name=name,
                     prevention=data["prevention"],
@@ -125,4 +474,6 @@ class DiseaseInfo(db.Model):
                     more_info_url=data["more_info_url"]
                 )
                 db.session.add(disease)
+        if added:
+            bump_data_version(DISEASE_INFO_VERSION)
         db.session.commit()
@@ -0,0 +1,69 @@
+"""Write Brotli and gzip siblings for the frontend build.
+
+    python precompress_static.py --build-dir ../frontend/build
+
+Run after `npm run build`; the index route serves `<file>.br` or
+`<file>.gz` to clients that accept them. Variants that would not be smaller
+than the original are skipped.
+"""
+import argparse
+import gzip
+import os
+
+import brotli
+
+COMPRESSIBLE = (".html", ".js", ".mjs", ".css", ".json", ".map", ".svg", ".txt", ".xml", ".ico", ".wasm", ".ttf", ".otf", ".webmanifest")
+MIN_SIZE = 1024  # Smaller files gain little and cost a round of decompression
+
+
+def write_if_smaller(path, data, original_size):
+    if len(data) >= original_size:
+        if os.path.exists(path):
+            os.remove(path)  # Stale variant from an earlier build
+        return False
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+def precompress(build_dir):
+    totals = {"files": 0, "original": 0, "br": 0, "gz": 0}
+    for directory, _, names in os.walk(build_dir):
+        for name in names:
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            if len(data) < MIN_SIZE:
+                continue
+
+            br_data = brotli.compress(data, quality=11)
+            gz_data = gzip.compress(data, compresslevel=9, mtime=0)  # mtime=0 keeps rebuilds byte-identical
+            totals["files"] += 1
+            totals["original"] += len(data)
+            totals["br"] += len(br_data) if write_if_smaller(path + ".br", br_data, len(data)) else len(data)
+            totals["gz"] += len(gz_data) if write_if_smaller(path + ".gz", gz_data, len(data)) else len(data)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompress the frontend build with Brotli and gzip.")
+    parser.add_argument("--build-dir", default=os.getenv("STATIC_BUILD_DIR", os.path.join("..", "frontend", "build")))
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.build_dir):
+        parser.error(f"{args.build_dir} is not a directory")
+
+    totals = precompress(args.build_dir)
+    if not totals["files"]:
+        print("Nothing to compress.")
+        return
+    print(f"Compressed {totals['files']} files: {totals['original'] / 1024:.0f} KB -> "
+          f"br {totals['br'] / 1024:.0f} KB, gzip {totals['gz'] / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import numpy as np
+
+from models import db, DataVersion, Production, production_version_name
+from routes.holt_winters import HoltWintersState
+from routes.utility import get_forecast_pool, production_value, reset_forecast_pool
+
+MIN_OBSERVATIONS = 8  # Two full seasons to initialise the additive seasonal terms
+MAX_REPORTED_ERRORS = 100
+
+
+def series_model_key(series_id):
+    """HoltWintersStore key of a production series."""
+    return f"production-{series_id}"
+
+
+def _fit_series(series_id, values, seasonal_periods):
+    """Runs in a pool worker: fit one series and return its state as a dict."""
+    try:
+        return series_id, HoltWintersState.fit(values, seasonal_periods).to_dict(), None
+    except Exception as e:
+        return series_id, None, str(e)
+
+
+def load_series(series_ids=None):
+    """Production values of every (or the given) series, from one ordered query.
+
+    Values are rounded like fetch_production_data, so a state stored here is
+    the one the forecast routes would have fitted.
+    """
+    query = db.select(Production.series_id, Production.value).order_by(Production.series_id, Production.date)
+    if series_ids:
+        query = query.where(Production.series_id.in_(series_ids))
+    series = {}
+    for series_id, value in db.session.execute(query):
+        series.setdefault(series_id, []).append(production_value(value))
+    return series
+
+
+class BatchForecaster:
+    """Fits many production series on the shared process pool.
+
+    Fitted states are stored in the HoltWintersStore under each series' current
+    data version, so forecast requests read them instead of fitting.
+    """
+
+    def __init__(self, app, model_store, seasonal_periods=4, chunksize=16):
+        self.app = app
+        self.model_store = model_store
+        self.seasonal_periods = seasonal_periods
+        self.chunksize = chunksize
+        self._lock = threading.Lock()
+        self._thread = None
+        self._status = {"state": "idle"}
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def _update(self, **fields):
+        with self._lock:
+            self._status.update(fields)
+
+    def run(self, series_ids=None, force=False):
+        """Fit the series in this thread (inside an app context) and return a summary."""
+        started = time.perf_counter()
+        self._update(state="running", started_at=datetime.utcnow().isoformat(), finished_at=None,
+                     total=0, fitted=0, skipped=0, failed=0, errors={})
+
+        series = load_series(series_ids)
+        versions = dict(db.session.execute(db.select(DataVersion.name, DataVersion.version)).all())
+        db.session.rollback()  # Nothing else to read, don't hold the transaction open
+
+        pending, skipped, errors = [], 0, {}
+        for series_id, values in series.items():
+            version = versions.get(production_version_name(series_id), 0)
+            if len(values) < MIN_OBSERVATIONS:
+                errors[series_id] = f"needs at least {MIN_OBSERVATIONS} observations"
+            elif not force and self.model_store.get(series_model_key(series_id), version) is not None:
+                skipped += 1
+            else:
+                pending.append((series_id, version, np.asarray(values, dtype=float)))
+        self._update(total=len(series), skipped=skipped, failed=len(errors))
+
+        fitted = 0
+        if pending:
+            version_of = {series_id: version for series_id, version, _ in pending}
+            try:
+                results = get_forecast_pool().map(
+                    _fit_series,
+                    [series_id for series_id, _, _ in pending],
+                    [values for _, _, values in pending],
+                    [self.seasonal_periods] * len(pending),
+                    chunksize=self.chunksize
+                )
+                for series_id, state, error in results:
+                    if state is None:
+                        errors[series_id] = error
+                    else:
+                        self.model_store.put(series_model_key(series_id), version_of[series_id], HoltWintersState.from_dict(state))
+                        fitted += 1
+                    self._update(fitted=fitted, failed=len(errors))
+            except BrokenProcessPool:
+                reset_forecast_pool()
+                raise
+
+        summary = {
+            "state": "done",
+            "total": len(series),
+            "fitted": fitted,
+            "skipped": skipped,
+            "failed": len(errors),
+            "errors": dict(list(errors.items())[:MAX_REPORTED_ERRORS]),
+            "seconds": round(time.perf_counter() - started, 2),
+            "finished_at": datetime.utcnow().isoformat(),
+        }
+        self._update(**summary)
+        return summary
+
+    def start(self, series_ids=None, force=False):
+        """Run in a background thread; returns False if a run is already in progress."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._status = {"state": "running"}
+            self._thread = threading.Thread(target=self._run_in_context, args=(series_ids, force),
+                                            name="batch-forecast", daemon=True)
+            self._thread.start()
+            return True
+
+    def _run_in_context(self, series_ids, force):
+        with self.app.app_context():
+            try:
+                self.run(series_ids, force)
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.error(f"Batch forecast failed: {e}")
+                self._update(state="failed", error=str(e), finished_at=datetime.utcnow().isoformat())
@@ -1,9 +1,265 @@
-from flask import request, jsonify, session
+from flask import Response, request, jsonify, session, stream_with_context
+from datetime import datetime
+import hashlib
+import json
+import os
+import tempfile
 import pandas as pd
-from models import Production, db
+from models import (
+    db, DEFAULT_SERIES, SERIES_ID_PATTERN, bump_data_version, copy_rows, duplicate_import_dates,
+    get_data_version, lock_production, production_version_name, replace_production,
+    swap_in_production_import, update_production_values, CsvImport, Production, ProductionImportRow
+)
+from routes.batch_forecast import series_model_key
+from routes.utility import production_value
 
+MAX_REPORTED_ERRORS = 1000
+
+
+def validate_production_frame(data, first_line=2):
+    """Parse the Date and Production columns at once.
+
+    Returns (rows, errors): rows are (date, value) tuples for the valid lines,
+    errors describe every invalid line by its line number in the file.
+    """
+    dates = pd.to_datetime(data['Date'], errors='coerce', format='mixed')
+    values = pd.to_numeric(data['Production'], errors='coerce')
+    bad_date = dates.isna()
+    bad_value = values.isna()
+    # Production is keyed on date, so a date may only appear once
+    duplicate_date = ~bad_date & dates.dt.normalize().duplicated()
+
+    errors = []
+    for position in (bad_date | bad_value | duplicate_date).to_numpy().nonzero()[0]:
+        if bad_date.iat[position]:
+            reason = 'invalid date'
+        elif bad_value.iat[position]:
+            reason = 'invalid production value'
+        else:
+            reason = 'duplicate date'
+        errors.append({
+            'line': int(position) + first_line,
+            'date': None if pd.isna(data['Date'].iat[position]) else str(data['Date'].iat[position]),
+            'production': None if pd.isna(data['Production'].iat[position]) else str(data['Production'].iat[position]),
+            'reason': reason,
+        })
+
+    rows = list(zip(dates.dt.date, values.astype(float))) if not errors else []
+    return rows, errors
+
+
+def invalid_rows_response(errors):
+    return jsonify({
+        'error': f"{len(errors)} invalid row(s) in CSV. No data was changed.",
+        'invalid_rows': errors[:MAX_REPORTED_ERRORS],
+    }), 400
+
+
+def init_csv_routes(app, forecast_cache, model_store):
+    def spool_upload(file):
+        """Copy the upload to disk in fixed-size blocks, hashing it on the way."""
+        spool_dir = app.config['CSV_SPOOL_DIR']
+        os.makedirs(spool_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=spool_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for block in iter(lambda: file.stream.read(1024 * 1024), b''):
+                    digest.update(block)
+                    out.write(block)
+                    size += len(block)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        checksum = digest.hexdigest()
+        spool_path = os.path.join(spool_dir, f'{checksum}.csv')
+        os.replace(tmp_path, spool_path)
+        return checksum, spool_path, size
+
+    def start_import(checksum, filename, size, series_id, chunk_rows):
+        """Return the import to resume, or None when this file is already the live data."""
+        csv_import = db.session.get(CsvImport, checksum, with_for_update=True)
+        if csv_import is None:
+            csv_import = CsvImport(checksum=checksum, series_id=series_id, filename=filename, bytes_total=size, chunk_rows=chunk_rows)
+            db.session.add(csv_import)
+        elif (csv_import.status == 'done' and csv_import.series_id == series_id
+              and csv_import.data_version == get_data_version(production_version_name(series_id))):
+            db.session.rollback()
+            return None
+        elif csv_import.status != 'loading' or csv_import.series_id != series_id or csv_import.chunk_rows != chunk_rows:
+            # Failed, superseded by a later upload, meant for another series or staged
+            # with another CSV_CHUNK_ROWS (chunk numbers would not line up): load it again from scratch
+            db.session.execute(db.delete(ProductionImportRow).where(ProductionImportRow.checksum == checksum))
+            csv_import.series_id = series_id
+            csv_import.chunk_rows = chunk_rows
+            csv_import.status = 'loading'
+            csv_import.chunks_done = 0
+            csv_import.rows_loaded = 0
+            csv_import.error = None
+            csv_import.finished_at = None
+        csv_import.updated_at = datetime.utcnow()
+        db.session.commit()
+        return csv_import
+
+    def fail_import(checksum, error):
+        csv_import = db.session.get(CsvImport, checksum)
+        csv_import.status = 'failed'
+        csv_import.error = json.dumps(error)
+        csv_import.updated_at = csv_import.finished_at = datetime.utcnow()
+        db.session.commit()
+        return csv_import
+
+    def stream_csv_upload(file, series_id):
+        """Validate and stage the CSV chunk by chunk, then swap it in.
+
+        Progress is streamed as NDJSON and can also be polled at
+        /api/csv_imports/<sha256 of the file>. Chunks already staged by an
+        interrupted upload of the same file are skipped,
+        as long as CSV_CHUNK_ROWS has not changed since.
+        """
+        checksum, spool_path, size = spool_upload(file)
+        columns = pd.read_csv(spool_path, nrows=0).columns
+        if 'Date' not in columns or 'Production' not in columns:
+            os.remove(spool_path)
+            return jsonify({'error': 'Invalid CSV format. Ensure the CSV has Date and Production columns.'}), 400
+
+        chunk_rows = app.config['CSV_CHUNK_ROWS']
+        csv_import = start_import(checksum, file.filename, size, series_id, chunk_rows)
+        if csv_import is None:
+            os.remove(spool_path)
+            return jsonify({
+                'message': 'This file is already the current production data.',
+                'import': db.session.get(CsvImport, checksum).to_dict()
+            }), 200
+        resume_from = csv_import.chunks_done
+
+        def generate():
+            yield json.dumps({'checksum': checksum, 'bytes_total': size, 'resumed_chunks': resume_from}) + '\n'
+            try:
+                first_line = 2
+                reader = pd.read_csv(spool_path, usecols=['Date', 'Production'], chunksize=chunk_rows)
+                for index, chunk in enumerate(reader):
+                    line, first_line = first_line, first_line + len(chunk)
+                    if index < resume_from:
+                        continue
+
+                    rows, errors = validate_production_frame(chunk, line)
+                    if errors:
+                        fail_import(checksum, errors[:MAX_REPORTED_ERRORS])
+                        yield json.dumps({
+                            'error': f"{len(errors)} invalid row(s) in CSV. No data was changed.",
+                            'invalid_rows': errors[:MAX_REPORTED_ERRORS]
+                        }) + '\n'
+                        return
+
+                    # Stage the chunk and record it as done in the same transaction
+                    csv_import = db.session.get(CsvImport, checksum, with_for_update=True)
+                    if csv_import.chunk_rows != chunk_rows:
+                        db.session.rollback()
+                        yield json.dumps({'error': 'The import was restarted by another upload of this file.', 'checksum': checksum}) + '\n'
+                        return
+                    if csv_import.status != 'loading' or csv_import.chunks_done > index:
+                        db.session.rollback()  # Another request got here first
+                        continue
+                    copy_rows(
+                        ProductionImportRow.__table__, ('checksum', 'chunk', 'date', 'value'),
+                        [(checksum, index, date, value) for date, value in rows]
+                    )
+                    csv_import.chunks_done = index + 1
+                    csv_import.rows_loaded += len(rows)
+                    csv_import.updated_at = datetime.utcnow()
+                    db.session.commit()
+                    yield json.dumps({'chunk': index, 'rows_loaded': csv_import.rows_loaded}) + '\n'
+
+                duplicates = duplicate_import_dates(checksum)
+                if duplicates:
+                    # Chunks are validated on their own, so repeats across chunks show up here
+                    errors = [{'date': str(date), 'reason': 'duplicate date'} for date in duplicates]
+                    fail_import(checksum, errors)
+                    yield json.dumps({'error': 'Duplicate dates in CSV. No data was changed.', 'invalid_rows': errors}) + '\n'
+                    return
+
+                csv_import = db.session.get(CsvImport, checksum, with_for_update=True)
+                if csv_import.status == 'loading':
+                    swap_in_production_import(checksum, series_id)
+                    csv_import.status = 'done'
+                    csv_import.data_version = bump_data_version(production_version_name(series_id))
+                    csv_import.updated_at = csv_import.finished_at = datetime.utcnow()
+                    db.session.commit()
+                    forecast_cache.clear()
+                yield json.dumps({'message': 'File uploaded successfully. Data has been replaced.', 'import': csv_import.to_dict()}) + '\n'
+            except Exception as e:
+                # Staged chunks stay committed; uploading the same file again resumes
+                db.session.rollback()
+                app.logger.error(f"CSV import {checksum} interrupted: {e}")
+                yield json.dumps({'error': f"An error occurred: {str(e)}", 'checksum': checksum}) + '\n'
+            finally:
+                try:
+                    os.remove(spool_path)
+                except OSError:
+                    pass
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    def upsert_csv(data, series_id):
+        """Merge the CSV into a production series by date and report what changed."""
+        rows, errors = validate_production_frame(data)
+        if errors:
+            return invalid_rows_response(errors)
+        incoming = pd.DataFrame(rows, columns=['date', 'value'])
+
+        # Hold writers off until the diff is applied
+        lock_production()
+        existing = pd.DataFrame(
+            db.session.execute(
+                db.select(Production.date, Production.value).where(Production.series_id == series_id)
+            ).all(),
+            columns=['date', 'value']
+        )
+        merged = incoming.merge(existing, on='date', how='left', suffixes=('', '_old'), indicator=True)
+        is_new = (merged['_merge'] == 'left_only').to_numpy()
+        is_changed = ~is_new & (merged['value'] != merged['value_old']).to_numpy()
+        inserted = merged[is_new].sort_values('date')
+        updated = merged[is_changed]
+        unchanged = merged[~is_new & ~is_changed]
+
+        report = {
+            'inserted': [str(date) for date in inserted['date']],
+            'updated': [str(date) for date in updated['date']],
+            'unchanged': [str(date) for date in unchanged['date']],
+        }
+        if inserted.empty and updated.empty:
+            db.session.rollback()
+            return jsonify({'message': 'No changes. Production data is already up to date.', **report}), 200
+
+        copy_rows(
+            Production.__table__, ('series_id', 'date', 'value'),
+            [(series_id, date, value) for date, value in zip(inserted['date'], inserted['value'])]
+        )
+        update_production_values(list(zip(updated['date'], updated['value'])), series_id)
+        version_name = production_version_name(series_id)
+        old_version = get_data_version(version_name)
+        new_version = bump_data_version(version_name)
+        db.session.commit()
+        forecast_cache.clear()
+
+        # Only new quarters after the last stored one: roll the fitted state forward instead of refitting
+        if updated.empty and not existing.empty and inserted['date'].min() > existing['date'].max():
+            try:
+                model_store.extend(series_model_key(series_id), old_version, new_version, [production_value(v) for v in inserted['value']])
+            except Exception as e:
+                app.logger.warning(f"Could not extend stored forecast model: {e}")
+
+        return jsonify({'message': 'Production data updated.', **report}), 200
+
+    @app.route('/api/csv_imports/<checksum>', methods=['GET'])
+    def csv_import_status(checksum):
+        csv_import = db.session.get(CsvImport, checksum)
+        if csv_import is None:
+            return jsonify({'error': 'Import not found'}), 404
+        return jsonify(csv_import.to_dict()), 200
 
-def init_csv_routes(app):
     @app.route('/api/upload_csv', methods=['POST'])
     def upload_csv():
         if 'file' not in request.files:
@@ -27,7 +283,20 @@ def init_csv_routes(app):
         else:
             return jsonify({'error': 'Severity value is required.'}), 400
 
+        # ?series=<farm or region id> targets one production series
+        series_id = request.args.get('series', request.form.get('series', DEFAULT_SERIES))
+        if not SERIES_ID_PATTERN.match(series_id):
+            return jsonify({'error': 'Invalid series id. Use letters, digits, ".", "_" or "-".'}), 400
+
         if file and file.filename.endswith('.csv'):
+            # ?mode=stream reads the file in bounded chunks for large histories
+            if request.args.get('mode', request.form.get('mode')) == 'stream':
+                try:
+                    return stream_csv_upload(file, series_id)
+                except Exception as e:
+                    db.session.rollback()
+                    return jsonify({'error': f"An error occurred: {str(e)}"}), 500
+
             try:
                 # Read the uploaded CSV file into a pandas DataFrame
                 data = pd.read_csv(file)
@@ -36,34 +305,25 @@ def init_csv_routes(app):
                 if 'Date' not in data.columns or 'Production' not in data.columns:
                     return jsonify({'error': 'Invalid CSV format. Ensure the CSV has Date and Production columns.'}), 400
 
-                # Clear the existing records in the database (or set to empty)
-                db.session.query(Production).delete()
-
-                # Process the new data
-                for _, row in data.iterrows():
-                    # Convert the date column, handle invalid formats
-                    try:
-                        date = pd.to_datetime(row['Date'], errors='coerce').date()
-                    except Exception:
-                        return jsonify({'error': f"Invalid date format in row: {row}"}), 400
-
-                    if pd.isna(date):
-                        return jsonify({'error': f"Invalid date in row: {row}"}), 400
+                # ?mode=upsert merges by date instead of replacing everything
+                if request.args.get('mode', request.form.get('mode')) == 'upsert':
+                    return upsert_csv(data, series_id)
 
-                    # Check if the production value is valid
-                    try:
-                        production_value = float(row['Production'])
-                    except ValueError:
-                        return jsonify({'error': f"Invalid production value in row: {row}"}), 400
+                rows, errors = validate_production_frame(data)
+                if errors:
+                    return invalid_rows_response(errors)
 
-                    # Add the new record to the database
-                    new_record = Production(date=date, value=production_value)
-                    db.session.add(new_record)
+                # Delete and bulk load in one transaction, so readers never see a half-replaced table
+                replace_production(rows, series_id)
 
+                # New version stamp invalidates cached forecasts in every worker
+                bump_data_version(production_version_name(series_id))
                 db.session.commit()
+                forecast_cache.clear()
                 return jsonify({'message': 'File uploaded successfully. Data has been replaced.'}), 200
 
             except Exception as e:
+                db.session.rollback()
                 return jsonify({'error': f"An error occurred: {str(e)}"}), 500
         else:
             return jsonify({'error': 'Invalid file format. Please upload a CSV file.'}), 400
\ No newline at end of file
@@ -0,0 +1,54 @@
+import hashlib
+import json
+import threading
+import time
+
+from models import DISEASE_INFO_VERSION, DiseaseInfo, get_data_version
+
+
+class DiseaseInfoCache:
+    """Process-local copy of the disease_info table.
+
+    Writers bump the 'disease_info' data version; every worker checks that
+    version at most once per `check_interval` seconds and reloads the table
+    only when it moved, so other workers see an edit within that interval.
+    The ETag is a hash of the loaded rows rather than the version, so a
+    response never revalidates against content it does not hold. Edits made
+    outside the app (SQL, migrations) should bump the version too, or they
+    are only picked up after a restart. Needs an app context.
+    """
+
+    def __init__(self, check_interval=1.0):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._version = None
+        self._items = []
+        self._by_name = {}
+        self._etag = None
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self.check_interval:
+            return
+        version = get_data_version(DISEASE_INFO_VERSION)
+        self._checked_at = now
+        if version != self._version:
+            self._items = [disease.to_dict() for disease in DiseaseInfo.query.order_by(DiseaseInfo.id)]
+            self._by_name = {item["name"]: item for item in self._items}
+            self._etag = hashlib.sha256(json.dumps(self._items, sort_keys=True).encode()).hexdigest()[:32]
+            self._version = version
+
+    def snapshot(self):
+        """Return (etag, list of DiseaseInfo.to_dict(), name -> dict mapping)."""
+        with self._lock:
+            self._refresh()
+            return self._etag, self._items, self._by_name
+
+    def by_name(self):
+        return self.snapshot()[2]
+
+    def invalidate(self):
+        """Reload on next use (after a write committed by this worker)."""
+        with self._lock:
+            self._version = None
@@ -0,0 +1,51 @@
+import glob
+import json
+import os
+import tempfile
+
+
+class ForecastCache:
+    """File-backed cache of forecast responses shared by every worker on the host.
+
+    Entries are keyed by forecast name, the `production` data version and the
+    severity, so a CSV upload (which bumps the version) makes them unreachable.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name, version, severity):
+        return os.path.join(self.root, f"{name}-v{version}-s{severity}.json")
+
+    def get(self, name, version, severity):
+        try:
+            with open(self._path(name, version, severity)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, name, version, severity, payload):
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, self._path(name, version, severity))
+
+    def get_or_compute(self, name, version, severity, compute):
+        """Return (payload, status); `compute` returns the same and only 200s are cached."""
+        payload = self.get(name, version, severity)
+        if payload is not None:
+            return payload, 200
+        payload, status = compute()
+        if status == 200:
+            self.put(name, version, severity, payload)
+        return payload, status
+
+    def clear(self):
+        """Remove every cached entry (stale versions are never read again anyway)."""
+        for path in glob.glob(os.path.join(self.root, "*.json")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+
+from models import DEFAULT_SERIES, get_data_version, production_version_name
+from routes.batch_forecast import series_model_key
+from routes.utility import fetch_production_data, time_series_k_fold
+
+NO_PRODUCTION_DATA = {'error': 'No production data available. Please upload data first.'}
+
+
+def _indexed_production(series_id):
+    production_data = fetch_production_data(series_id)
+    production_data['date'] = pd.to_datetime(production_data['date'])
+    production_data.set_index('date', inplace=True)
+    return production_data
+
+
+class ForecastService:
+    """Loss forecasts for a production series, shared by the forecasting and report routes.
+
+    Each method returns (payload, status) and is served from the forecast cache
+    until the series' data version changes.
+    """
+
+    def __init__(self, app, forecast_cache, model_store):
+        self.app = app
+        self.cache = forecast_cache
+        self.model_store = model_store
+
+    def _cached(self, name, severity_value, series_id, compute):
+        version = get_data_version(production_version_name(series_id))
+        return self.cache.get_or_compute(
+            f'{name}-{series_id}', version, severity_value,
+            lambda: compute(severity_value, version, series_id)
+        )
+
+    def forecast_losses(self, severity_value, series_id=DEFAULT_SERIES):
+        return self._cached('forecast-losses', severity_value, series_id, self._compute_forecast_losses)
+
+    def bar_forecast_losses(self, severity_value, series_id=DEFAULT_SERIES):
+        return self._cached('bar-forecast-losses', severity_value, series_id, self._compute_bar_forecast_losses)
+
+    def bargraph_losses(self, severity_value, series_id=DEFAULT_SERIES):
+        return self._cached('bargraph-losses', severity_value, series_id, self._compute_bargraph_losses)
+
+    def scenarios(self, severities, series_id=DEFAULT_SERIES):
+        version = get_data_version(production_version_name(series_id))
+        return self._compute_scenarios(severities, version, series_id)
+
+    def _compute_forecast_losses(self, severity_value, version, series_id):
+        production_data = _indexed_production(series_id)
+        if production_data.empty:
+            return NO_PRODUCTION_DATA, 400
+
+        # Calculate the loss percentage based on the severity value (scaled from 1 to 10)
+        total_loss_percentage = severity_value / 100  # Severity of 1 -> 1%, Severity of 10 -> 10%
+
+        # Perform k-fold cross-validation
+        cv_metrics = time_series_k_fold(production_data, k=10, method=self.app.config.get('FORECAST_CV_METHOD', 'kfold'))
+
+        # Forecast the first quarter from the model fitted once for this data version
+        model = self.model_store.get_or_fit(series_model_key(series_id), version, production_data['value'])
+        first_quarter_forecast = model.forecast(1)
+
+        # Calculate actual losses for the first quarter
+        actual_loss_first_quarter = first_quarter_forecast[0] * total_loss_percentage if total_loss_percentage > 0 else 0
+        adjusted_first_quarter = first_quarter_forecast[0] - actual_loss_first_quarter
+
+        # Append the adjusted first quarter to the model state and forecast the remaining 7 quarters
+        last_date = production_data.index[-1]
+        remaining_forecast = model.update(adjusted_first_quarter).forecast(7)
+
+        # Calculate actual losses and adjusted values for the remaining quarters
+        actual_losses = [
+            value * total_loss_percentage if total_loss_percentage > 0 else 0
+            for value in remaining_forecast
+        ]
+        adjusted_remaining_forecast = [
+            value - loss for value, loss in zip(remaining_forecast, actual_losses)
+        ]
+
+        # Combine forecasts
+        forecast_dates = [last_date + pd.DateOffset(months=3 * i) for i in range(1, 9)]
+        combined_forecast = [adjusted_first_quarter] + adjusted_remaining_forecast
+        actual_losses = [actual_loss_first_quarter] + actual_losses
+
+        response = {
+            'forecast_dates': [date.strftime('%Y-%m-%d') for date in forecast_dates],
+            'next_8_quarters_forecast': [first_quarter_forecast[0]] + remaining_forecast.tolist(),
+            'adjusted_production': combined_forecast,
+            'actual_losses': actual_losses,
+            'evaluation_metrics': cv_metrics,
+            'severity_range': [f"{severity_value * 1}%"]  # Show severity as a percentage
+        }
+        return response, 200
+
+    def _compute_bar_forecast_losses(self, severity_value, version, series_id):
+        production_data = _indexed_production(series_id)
+        if production_data.empty:
+            return NO_PRODUCTION_DATA, 400
+
+        total_loss_percentage = severity_value / 100
+
+        model = self.model_store.get_or_fit(series_model_key(series_id), version, production_data['value'])
+        first_quarter_forecast = model.forecast(1)
+
+        actual_loss_first_quarter = first_quarter_forecast[0] * total_loss_percentage
+        adjusted_first_quarter = first_quarter_forecast[0] - actual_loss_first_quarter
+
+        last_date = production_data.index[-1]
+        remaining_forecast = model.update(adjusted_first_quarter).forecast(7)
+
+        actual_losses = [value * total_loss_percentage for value in remaining_forecast]
+        adjusted_remaining_forecast = [
+            value - loss for value, loss in zip(remaining_forecast, actual_losses)
+        ]
+
+        forecast_dates = [last_date + pd.DateOffset(months=3 * i) for i in range(1, 9)]
+        combined_forecast = [adjusted_first_quarter] + adjusted_remaining_forecast
+        actual_losses = [actual_loss_first_quarter] + actual_losses
+
+        response = {
+            'forecast_dates': [date.strftime('%Y-%m-%d') for date in forecast_dates],
+            'expected_production': [first_quarter_forecast[0]] + remaining_forecast.tolist(),
+            'adjusted_production': combined_forecast,
+            'loss_production_impact': actual_losses,
+        }
+        return response, 200
+
+    def _compute_scenarios(self, severities, version, series_id):
+        """Expected, adjusted and loss series for every severity in one broadcast."""
+        production_data = _indexed_production(series_id)
+        if production_data.empty:
+            return NO_PRODUCTION_DATA, 400
+
+        model = self.model_store.get_or_fit(series_model_key(series_id), version, production_data['value'])
+        first_quarter = model.forecast(1)[0]
+
+        # One row per severity: losses are a column vector broadcast over the 8 quarters
+        loss = severities[:, None] / 100
+        adjusted_first_quarter = first_quarter * (1 - loss[:, 0])
+        remaining = model.update(adjusted_first_quarter).forecast(7)
+
+        expected = np.concatenate([np.full((len(severities), 1), first_quarter), remaining], axis=1)
+        losses = expected * loss
+        adjusted = expected - losses
+
+        last_date = production_data.index[-1]
+        forecast_dates = [last_date + pd.DateOffset(months=3 * i) for i in range(1, 9)]
+        return {
+            'forecast_dates': [date.strftime('%Y-%m-%d') for date in forecast_dates],
+            'severities': severities.tolist(),
+            'expected_production': expected.round(2).tolist(),
+            'adjusted_production': adjusted.round(2).tolist(),
+            'actual_losses': losses.round(2).tolist(),
+        }, 200
+
+    def _compute_bargraph_losses(self, severity_value, version, series_id):
+        # Fetch production data
+        production_data = fetch_production_data(series_id)
+
+        if production_data.empty:
+            return NO_PRODUCTION_DATA, 400
+
+        production_data['date'] = pd.to_datetime(production_data['date'])
+        production_data.set_index('date', inplace=True)
+
+        # Define cutoff date for checking future data
+        future_start_date = pd.to_datetime('2024-01-01')
+
+        # Check if data contains any future dates
+        if production_data.index.max() <= future_start_date:
+            return {'error': 'No future data available for forecasting.'}, 400
+
+        # Define the cutoff date for historical data: up to 2024Q1
+        cutoff_date = pd.to_datetime('2024-03-31')
+        historical_data = production_data.loc[:cutoff_date]
+
+        if historical_data.empty:
+            return {'error': 'No historical data available for forecasting.'}, 400
+
+        # Fit the model on historical data (once per data version)
+        model = self.model_store.get_or_fit(f'{series_model_key(series_id)}-until-2024Q1', version, historical_data['value'])
+
+        # Generate forecast
+        forecast_start_date = pd.to_datetime('2024-04-01')
+        forecast_end_date = forecast_start_date + pd.DateOffset(years=2)
+        forecast_index = pd.date_range(start=forecast_start_date, end=forecast_end_date, freq='Q')
+        forecast_values = model.forecast(len(forecast_index))
+
+        if len(forecast_values) == 0:
+            return {'error': 'Forecasting failed. No data available for predictions.'}, 400
+
+        # Adjust values based on severity
+        loss_percentage = severity_value / 100
+        adjusted_values = [val * (1 - loss_percentage) for val in forecast_values]
+        actual_losses = [val * loss_percentage for val in forecast_values]
+
+        forecast_dates_formatted = [
+            f"{date.year}Q{(date.month - 1) // 3 + 1}" for date in forecast_index
+        ]
+
+        return {
+            'dates': forecast_dates_formatted,
+            'expected_production': forecast_values.tolist(),
+            'adjusted_production': adjusted_values,
+            'actual_losses': actual_losses,
+        }, 200
@@ -1,18 +1,42 @@
-from flask import jsonify
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
-from sklearn.metrics import mean_absolute_error
+from flask import jsonify, request
+import numpy as np
 import pandas as pd
-from models import Production
+from models import db, DEFAULT_SERIES, SERIES_ID_PATTERN, Production, get_data_version, production_version_name
 from flask import session
 
-from routes.utility import fetch_production_data, time_series_k_fold
+from routes.batch_forecast import BatchForecaster, series_model_key
+from routes.static_dataset import StaticDataset
+from routes.utility import fetch_production_data
 
 
-def init_forecasting_routes(app):
+def load_cacao_csv(path):
+    dataframe = pd.read_csv(path)
+    # Convert the 'Date' column to datetime
+    dataframe['Date'] = pd.to_datetime(dataframe['Date'], format='%m/%d/%Y')
+    return dataframe
+
+
+def init_forecasting_routes(app, forecast_service):
+    model_store = forecast_service.model_store
+    batch_forecaster = BatchForecaster(app, model_store)
+    # Historical dataset behind /api/prediction and /api/production_by_year
+    cacao_dataset = StaticDataset('Cacao Production (DDN).csv', load_cacao_csv)
+
+    def requested_series():
+        """?series=<farm or region id>; None when the id is not valid."""
+        series_id = request.args.get('series', DEFAULT_SERIES)
+        return series_id if SERIES_ID_PATTERN.match(series_id) else None
+
+    def invalid_series_response():
+        return jsonify({'error': 'Invalid series id. Use letters, digits, ".", "_" or "-".'}), 400
+
     @app.route('/api/get_production_data', methods=['GET'])
     def get_production_data():
+        series_id = requested_series()
+        if series_id is None:
+            return invalid_series_response()
         try:
-            production_data = Production.query.order_by(Production.date).all()
+            production_data = Production.query.filter_by(series_id=series_id).order_by(Production.date).all()
             result = [{'date': str(item.date), 'value': item.value} for item in production_data]
             return jsonify({'production': result}), 200
         except Exception as e:
@@ -21,70 +45,16 @@ def init_forecasting_routes(app):
 
     @app.route('/api/forecast-losses', methods=['GET'])
     def forecast_losses():
+        series_id = requested_series()
+        if series_id is None:
+            return invalid_series_response()
         try:
-            production_data = fetch_production_data()
-            production_data['date'] = pd.to_datetime(production_data['date'])
-            production_data.set_index('date', inplace=True)
-
             # Fetch the severity value from the session
             severity_value = session.get('severity', 1)  # Default to severity of 1 if not set
 
-            # Calculate the loss percentage based on the severity value (scaled from 1 to 10)
-            total_loss_percentage = severity_value / 100  # Severity of 1 -> 1%, Severity of 10 -> 10%
-
-            # Perform k-fold cross-validation
-            cv_metrics = time_series_k_fold(production_data, k=10)
-
-            # Train the model and forecast the first quarter
-            model = ExponentialSmoothing(
-                production_data['value'],
-                trend='add',
-                seasonal='add',
-                seasonal_periods=4
-            ).fit()
-            first_quarter_forecast = model.forecast(1)
-
-            # Calculate actual losses for the first quarter
-            actual_loss_first_quarter = first_quarter_forecast[0] * total_loss_percentage if total_loss_percentage > 0 else 0
-            adjusted_first_quarter = first_quarter_forecast[0] - actual_loss_first_quarter
-
-            # Update the production data with the adjusted first quarter
-            last_date = production_data.index[-1]
-            updated_data = production_data.copy()
-            updated_data.loc[last_date + pd.DateOffset(months=3)] = adjusted_first_quarter
-
-            # Re-train the model on the updated data and forecast the remaining 7 quarters
-            model = ExponentialSmoothing(
-                updated_data['value'],
-                trend='add',
-                seasonal='add',
-                seasonal_periods=4
-            ).fit()
-            remaining_forecast = model.forecast(7)
-
-            # Calculate actual losses and adjusted values for the remaining quarters
-            actual_losses = [
-                value * total_loss_percentage if total_loss_percentage > 0 else 0
-                for value in remaining_forecast
-            ]
-            adjusted_remaining_forecast = [
-                value - loss for value, loss in zip(remaining_forecast, actual_losses)
-            ]
-
-            # Combine forecasts
-            forecast_dates = [last_date + pd.DateOffset(months=3 * i) for i in range(1, 9)]
-            combined_forecast = [adjusted_first_quarter] + adjusted_remaining_forecast
-            actual_losses = [actual_loss_first_quarter] + actual_losses
-
-            response = {
-                'forecast_dates': [date.strftime('%Y-%m-%d') for date in forecast_dates],
-                'next_8_quarters_forecast': [first_quarter_forecast[0]] + remaining_forecast.tolist(),
-                'adjusted_production': combined_forecast,
-                'actual_losses': actual_losses,
-                'evaluation_metrics': cv_metrics,
-                'severity_range': [f"{severity_value * 1}%"]  # Show severity as a percentage
-            }
-            return jsonify(response)
+            # Served from the shared cache until the production data changes
+            response, status = forecast_service.forecast_losses(severity_value, series_id)
+            return jsonify(response), status
 
         except Exception as e:
             app.logger.error(f"Error during forecasting: {e}")
@@ -92,63 +62,48 @@ def init_forecasting_routes(app):
 
     @app.route('/api/bar-forecast-losses', methods=['GET']) 
     def bar_forecast_losses():
+        series_id = requested_series()
+        if series_id is None:
+            return invalid_series_response()
         try:
-            production_data = fetch_production_data()
-            production_data['date'] = pd.to_datetime(production_data['date'])
-            production_data.set_index('date', inplace=True)
-
             severity_value = session.get('severity', 1)  # Default to severity of 1 if not set
-            total_loss_percentage = severity_value / 100
-
-            model = ExponentialSmoothing(
-                production_data['value'],
-                trend='add',
-                seasonal='add',
-                seasonal_periods=4
-            ).fit()
-            first_quarter_forecast = model.forecast(1)
-
-            actual_loss_first_quarter = first_quarter_forecast[0] * total_loss_percentage
-            adjusted_first_quarter = first_quarter_forecast[0] - actual_loss_first_quarter
-
-            last_date = production_data.index[-1]
-            updated_data = production_data.copy()
-            updated_data.loc[last_date + pd.DateOffset(months=3)] = adjusted_first_quarter
-
-            model = ExponentialSmoothing(
-                updated_data['value'],
-                trend='add',
-                seasonal='add',
-                seasonal_periods=4
-            ).fit()
-            remaining_forecast = model.forecast(7)
-
-            actual_losses = [value * total_loss_percentage for value in remaining_forecast]
-            adjusted_remaining_forecast = [
-                value - loss for value, loss in zip(remaining_forecast, actual_losses)
-            ]
-
-            forecast_dates = [last_date + pd.DateOffset(months=3 * i) for i in range(1, 9)]
-            combined_forecast = [adjusted_first_quarter] + adjusted_remaining_forecast
-            actual_losses = [actual_loss_first_quarter] + actual_losses
-
-            response = {
-                'forecast_dates': [date.strftime('%Y-%m-%d') for date in forecast_dates],
-                'expected_production': [first_quarter_forecast[0]] + remaining_forecast.tolist(),
-                'adjusted_production': combined_forecast,
-                'loss_production_impact': actual_losses,
-            }
-            return jsonify(response)
+            response, status = forecast_service.bar_forecast_losses(severity_value, series_id)
+            return jsonify(response), status
         except Exception as e:
             app.logger.error(f"Error during forecasting: {e}")
             return jsonify({'error': str(e)}), 500
 
+
+    @app.route('/api/forecast-scenarios', methods=['GET'])
+    def forecast_scenarios():
+        series_id = requested_series()
+        if series_id is None:
+            return invalid_series_response()
+
+        # ?severities=1,5,10 (defaults to every severity from 1 to 10)
+        raw = request.args.get('severities')
+        try:
+            severities = np.array([float(v) for v in raw.split(',')] if raw else range(1, 11), dtype=float)
+        except ValueError:
+            return jsonify({'error': 'severities must be a comma-separated list of numbers'}), 400
+        if not len(severities) or len(severities) > 100 or ((severities < 0) | (severities > 100)).any():
+            return jsonify({'error': 'Provide between 1 and 100 severities, each from 0 to 100'}), 400
+
+        try:
+            response, status = forecast_service.scenarios(severities, series_id)
+            return jsonify(response), status
+        except Exception as e:
+            app.logger.error(f"Error during scenario forecasting: {e}")
+            return jsonify({'error': str(e)}), 500
     
     @app.route('/api/production-losses', methods=['GET'])
     def production_losses():
+        series_id = requested_series()
+        if series_id is None:
+            return invalid_series_response()
         try:
             # Fetch production data from the database
-            production_data = fetch_production_data()
+            production_data = fetch_production_data(series_id)
 
             if production_data.empty:
                 return jsonify({'error': 'No production data available. Please upload data first.'}), 400
@@ -177,118 +132,139 @@ def init_forecasting_routes(app):
                 
     @app.route('/api/bargraph-losses', methods=['GET'])
     def bargraph_losses():
+        series_id = requested_series()
+        if series_id is None:
+            return invalid_series_response()
         try:
-            # Fetch production data
-            production_data = fetch_production_data()
-
-            if production_data.empty:
-                return jsonify({'error': 'No production data available. Please upload data first.'}), 400
-
-            production_data['date'] = pd.to_datetime(production_data['date'])
-            production_data.set_index('date', inplace=True)
-
-            # Define cutoff date for checking future data
-            future_start_date = pd.to_datetime('2024-01-01')
-
-            # Check if data contains any future dates
-            if production_data.index.max() <= future_start_date:
-                return jsonify({'error': 'No future data available for forecasting.'}), 400
-
-            # Define the cutoff date for historical data: up to 2024Q1
-            cutoff_date = pd.to_datetime('2024-03-31')
-            historical_data = production_data.loc[:cutoff_date]
-
-            if historical_data.empty:
-                return jsonify({'error': 'No historical data available for forecasting.'}), 400
-
-            # Fit the model on historical data
-            model = ExponentialSmoothing(
-                historical_data['value'],
-                trend='add',
-                seasonal='add',
-                seasonal_periods=4
-            ).fit()
-
-            # Generate forecast
-            forecast_start_date = pd.to_datetime('2024-04-01')
-            forecast_end_date = forecast_start_date + pd.DateOffset(years=2)
-            forecast_index = pd.date_range(start=forecast_start_date, end=forecast_end_date, freq='Q')
-            forecast_values = model.forecast(len(forecast_index))
+            severity_value = session.get('severity', 1)
+            response, status = forecast_service.bargraph_losses(severity_value, series_id)
+            return jsonify(response), status
 
-            if len(forecast_values) == 0:
-                return jsonify({'error': 'Forecasting failed. No data available for predictions.'}), 400
+        except Exception as e:
+            app.logger.error(f"Error during forecasting: {e}")
+            return jsonify({'error': str(e)}), 500
 
-            # Adjust values based on severity
-            severity_value = session.get('severity', 1)
-            loss_percentage = severity_value / 100
-            adjusted_values = [val * (1 - loss_percentage) for val in forecast_values]
-            actual_losses = [val * loss_percentage for val in forecast_values]
+    # ---------------------------------- Multi-series batch forecasting ---------------------------------- #
 
-            forecast_dates_formatted = [
-                f"{date.year}Q{(date.month - 1) // 3 + 1}" for date in forecast_index
+    @app.route('/api/series', methods=['GET'])
+    def list_series():
+        try:
+            rows = db.session.execute(
+                db.select(
+                    Production.series_id,
+                    db.func.count(Production.id),
+                    db.func.min(Production.date),
+                    db.func.max(Production.date)
+                ).group_by(Production.series_id).order_by(Production.series_id)
+            ).all()
+            series = [
+                {'series_id': series_id, 'observations': count, 'first_date': str(first), 'last_date': str(last)}
+                for series_id, count, first, last in rows
             ]
+            return jsonify({'series': series}), 200
+        except Exception as e:
+            app.logger.error(f"Error listing production series: {e}")
+            return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/series/<series_id>/forecast', methods=['GET'])
+    def series_forecast(series_id):
+        if not SERIES_ID_PATTERN.match(series_id):
+            return invalid_series_response()
+        steps = request.args.get('steps', 8, type=int)
+        if not 1 <= steps <= 40:
+            return jsonify({'error': 'steps must be between 1 and 40'}), 400
+
+        try:
+            production_data = fetch_production_data(series_id)
+            if production_data.empty:
+                return jsonify({'error': f"No production data for series {series_id}"}), 404
+            version = get_data_version(production_version_name(series_id))
+            # Normally stored by the batch job; fitted here only for series it has not reached yet
+            model = model_store.get_or_fit(series_model_key(series_id), version, production_data['value'])
+            last_date = pd.to_datetime(production_data['date'].iloc[-1])
+            forecast_dates = [last_date + pd.DateOffset(months=3 * i) for i in range(1, steps + 1)]
             return jsonify({
-                'dates': forecast_dates_formatted,
-                'expected_production': forecast_values.tolist(),
-                'adjusted_production': adjusted_values,
-                'actual_losses': actual_losses,
+                'series_id': series_id,
+                'forecast_dates': [date.strftime('%Y-%m-%d') for date in forecast_dates],
+                'forecast': model.forecast(steps).round(2).tolist(),
             }), 200
-
         except Exception as e:
-            app.logger.error(f"Error during forecasting: {e}")
+            app.logger.error(f"Error forecasting series {series_id}: {e}")
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/batch_forecast', methods=['GET', 'POST'])
+    def batch_forecast():
+        if request.method == 'GET':
+            return jsonify(batch_forecaster.status()), 200
+
+        # {"series": [...] (default: all), "force": true to refit already stored states}
+        data = request.get_json(silent=True) or {}
+        series_ids = data.get('series')
+        if series_ids is not None and (
+            not isinstance(series_ids, list) or not all(isinstance(i, str) and SERIES_ID_PATTERN.match(i) for i in series_ids)
+        ):
+            return invalid_series_response()
+        if not batch_forecaster.start(series_ids, bool(data.get('force'))):
+            return jsonify({'error': 'A batch forecast is already running', **batch_forecaster.status()}), 409
+        return jsonify(batch_forecaster.status()), 202
+
+    @app.cli.command("batch-forecast")
+    def batch_forecast_command():
+        """Fit and store the Holt-Winters state of every production series."""
+        summary = batch_forecaster.run(force=True)
+        print(f"Fitted {summary['fitted']} of {summary['total']} series in {summary['seconds']}s "
+              f"({summary['failed']} failed).")
+
      
      # ---------------------------------- ExponentialSmoothing Model ------------------------------------ #
     
-    @app.route('/api/prediction', methods=['GET'])
-    def prediction():
-        try:
-            # Load the dataset
-            dataframe = pd.read_csv('Cacao Production (DDN).csv')
+    def compute_prediction(dataframe):
+        from statsmodels.tsa.holtwinters import ExponentialSmoothing # Deferred, heavy import
+        from sklearn.metrics import mean_absolute_error
 
-            # Convert the 'Date' column to datetime
-            dataframe['Date'] = pd.to_datetime(dataframe['Date'], format='%m/%d/%Y')
+        if dataframe.empty or 'Production' not in dataframe.columns:
+            raise ValueError("Dataset is empty or malformed")
 
-            if dataframe.empty or 'Production' not in dataframe.columns:
-                return jsonify({"error": "Dataset is empty or malformed"}), 500
+        # Define Exponential Smoothing model
+        exp_smooth_model = ExponentialSmoothing(dataframe['Production'], trend='add', seasonal='add', seasonal_periods=4).fit()
 
-            # Define Exponential Smoothing model
-            exp_smooth_model = ExponentialSmoothing(dataframe['Production'], trend='add', seasonal='add', seasonal_periods=4).fit()
+        # Forecast the next 8 quarters (2 years) starting from 2024/4/1 (Q2 2024)
+        forecast_start_date = pd.Timestamp('2024-04-01')  # Start from Q2 2024
+        steps = 8
 
-            # Forecast the next 8 quarters (2 years) starting from 2024/4/1 (Q2 2024)
-            forecast_start_date = pd.Timestamp('2024-04-01')  # Start from Q2 2024
-            steps = 8
+        predictions = exp_smooth_model.forecast(steps=steps)
+        
+        # Round the forecasted production values to 2 decimal places
+        pred_mean_rounded = predictions.round(2)
 
-            predictions = exp_smooth_model.forecast(steps=steps)
-            
-            # Round the forecasted production values to 2 decimal places
-            pred_mean_rounded = predictions.round(2)
+        # Generate future dates in 'Year-Q' format starting from 2024-Q2
+        future_dates = pd.date_range(forecast_start_date, periods=steps, freq='Q')
+        future_formatted_dates = [f"{date.year}-Q{(date.month - 1) // 3 + 1}" for date in future_dates]
 
-            # Generate future dates in 'Year-Q' format starting from 2024-Q2
-            future_dates = pd.date_range(forecast_start_date, periods=steps, freq='Q')
-            future_formatted_dates = [f"{date.year}-Q{(date.month - 1) // 3 + 1}" for date in future_dates]
+        # Combine actual and forecasted data
+        actual_data = dataframe[['Date', 'Production']].copy()
+        actual_data['Date'] = actual_data['Date'].dt.to_period('Q').astype(str)  # Convert to 'Year-Q' format
 
-            # Combine actual and forecasted data
-            actual_data = dataframe[['Date', 'Production']].copy()
-            actual_data['Date'] = actual_data['Date'].dt.to_period('Q').astype(str)  # Convert to 'Year-Q' format
+        # Calculate MAE using actual data and model fitted values
+        mae = mean_absolute_error(dataframe['Production'], exp_smooth_model.fittedvalues.round(2))
 
-            # Calculate MAE using actual data and model fitted values
-            mae = mean_absolute_error(dataframe['Production'], exp_smooth_model.fittedvalues.round(2))
-            print(f"Calculated MAE: {mae}")  # Debugging line
+        forecast_data = pd.DataFrame({
+            'Date': future_formatted_dates,
+            'Production': pred_mean_rounded
+        })
 
-            forecast_data = pd.DataFrame({
-                'Date': future_formatted_dates,
-                'Production': pred_mean_rounded
-            })
+        return {
+            'actual': actual_data.to_dict(orient='records'),
+            'forecast': forecast_data.to_dict(orient='records'),
+            'dates': future_formatted_dates,
+            'mae': round(mae, 2)  # Return MAE rounded to 2 decimal places
+        }
 
-            return jsonify({
-                'actual': actual_data.to_dict(orient='records'),
-                'forecast': forecast_data.to_dict(orient='records'),
-                'dates': future_formatted_dates,
-                'mae': round(mae, 2)  # Return MAE rounded to 2 decimal places
-            })
+    @app.route('/api/prediction', methods=['GET'])
+    def prediction():
+        try:
+            # Fitted once per version of the CSV file
+            return jsonify(cacao_dataset.derived('prediction', compute_prediction))
 
         except Exception as e:
             print(f"Error in prediction endpoint: {str(e)}")
@@ -296,19 +272,16 @@ def init_forecasting_routes(app):
                
         # ---------------------------------- Bar Graph Model ------------------------------------ #
         
+    def compute_production_by_year(dataframe):
+        # Aggregate production by year
+        yearly_production = dataframe.groupby(dataframe['Date'].dt.year.rename('Year'))['Production'].sum().reset_index()
+        return yearly_production.to_dict(orient='records')
+
     @app.route('/api/production_by_year', methods=['GET'])
     def production_by_year():
         try:
-            # Load the dataset
-            dataframe = pd.read_csv('Cacao Production (DDN).csv')
-            dataframe['Date'] = pd.to_datetime(dataframe['Date'], format='%m/%d/%Y')
-            
-            # Aggregate production by year
-            dataframe['Year'] = dataframe['Date'].dt.year
-            yearly_production = dataframe.groupby('Year')['Production'].sum().reset_index()
-            
-            return jsonify(yearly_production.to_dict(orient='records'))
+            return jsonify(cacao_dataset.derived('production_by_year', compute_production_by_year))
         
         except Exception as e:
             print(f"Error in production_by_year endpoint: {str(e)}")
-            return jsonify({"error": str(e)}), 500
\ No newline at end of file
+            return jsonify({"error": str(e)}), 500
@@ -0,0 +1,152 @@
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+
+class HoltWintersState:
+    """Additive-trend, additive-seasonal Holt-Winters model as parameters plus end state.
+
+    `level`, `trend` and `seasons` may carry leading batch dimensions, so one
+    state can hold many scenarios at once (see `update`). `seasons[..., 0]` is
+    the seasonal term of the next step.
+    """
+
+    def __init__(self, alpha, beta, gamma, level, trend, seasons):
+        self.alpha = float(alpha)
+        self.beta = float(beta)
+        self.gamma = float(gamma)
+        self.level = np.asarray(level, dtype=float)
+        self.trend = np.asarray(trend, dtype=float)
+        self.seasons = np.asarray(seasons, dtype=float)
+
+    @property
+    def seasonal_periods(self):
+        return self.seasons.shape[-1]
+
+    @classmethod
+    def fit(cls, values, seasonal_periods=4):
+        """Optimize the smoothing parameters once with statsmodels and keep the end state."""
+        from statsmodels.tsa.holtwinters import ExponentialSmoothing # Deferred, heavy import
+
+        results = ExponentialSmoothing(
+            np.asarray(values, dtype=float),
+            trend='add',
+            seasonal='add',
+            seasonal_periods=seasonal_periods
+        ).fit()
+        params = results.params
+        return cls(
+            params['smoothing_level'],
+            params['smoothing_trend'],
+            params['smoothing_seasonal'],
+            np.asarray(results.level)[-1],
+            np.asarray(results.trend)[-1],
+            np.asarray(results.season)[-seasonal_periods:]
+        )
+
+    def forecast(self, steps):
+        """Forecast `steps` values ahead; the result has shape batch + (steps,)."""
+        h = np.arange(1, steps + 1)
+        return (
+            self.level[..., None]
+            + h * self.trend[..., None]
+            + self.seasons[..., (h - 1) % self.seasonal_periods]
+        )
+
+    def update(self, value):
+        """Return the state after observing `value`, without re-optimizing the parameters.
+
+        `value` may be an array, which yields one state per element.
+        """
+        value = np.asarray(value, dtype=float)
+        season = self.seasons[..., 0]
+        level = self.alpha * (value - season) + (1 - self.alpha) * (self.level + self.trend)
+        trend = self.beta * (level - self.level) + (1 - self.beta) * self.trend
+        new_season = self.gamma * (value - self.level - self.trend) + (1 - self.gamma) * season
+
+        rest = np.broadcast_to(self.seasons[..., 1:], new_season.shape + (self.seasonal_periods - 1,))
+        seasons = np.concatenate([rest, new_season[..., None]], axis=-1)
+        return HoltWintersState(self.alpha, self.beta, self.gamma, level, trend, seasons)
+
+    def extend(self, values):
+        state = self
+        for value in values:
+            state = state.update(value)
+        return state
+
+    def to_dict(self):
+        return {
+            "alpha": self.alpha,
+            "beta": self.beta,
+            "gamma": self.gamma,
+            "level": self.level.tolist(),
+            "trend": self.trend.tolist(),
+            "seasons": self.seasons.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["alpha"], data["beta"], data["gamma"], data["level"], data["trend"], data["seasons"])
+
+
+class HoltWintersStore:
+    """Fitted Holt-Winters states persisted per series key and data version.
+
+    States are fitted once per data version and shared through JSON files, so
+    every worker answers forecasts from the stored parameters.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key, version):
+        return os.path.join(self.root, f"{key}-v{version}.json")
+
+    def get(self, key, version):
+        with self._lock:
+            state = self._memo.get((key, version))
+        if state is not None:
+            return state
+        try:
+            with open(self._path(key, version)) as f:
+                state = HoltWintersState.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+        with self._lock:
+            self._memo[(key, version)] = state
+        return state
+
+    def put(self, key, version, state):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(state.to_dict(), f)
+        os.replace(tmp_path, self._path(key, version))
+        with self._lock:
+            # Older versions of this key are never asked for again
+            self._memo = {k: v for k, v in self._memo.items() if k[0] != key}
+            self._memo[(key, version)] = state
+
+    def get_or_fit(self, key, version, values, seasonal_periods=4):
+        state = self.get(key, version)
+        if state is None:
+            state = HoltWintersState.fit(values, seasonal_periods)
+            self.put(key, version, state)
+        return state
+
+    def extend(self, key, old_version, new_version, new_values):
+        """Carry a stored state forward over appended observations.
+
+        Returns the new state, or None when there is no stored state to extend.
+        """
+        state = self.get(key, old_version)
+        if state is None:
+            return None
+        state = state.extend(new_values)
+        self.put(key, new_version, state)
+        return state
@@ -0,0 +1,66 @@
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+IMAGE_SIZE = (224, 224)
+
+# ImageNet channel means in BGR order, as used by keras.applications.resnet
+_RESNET_MEAN_BGR = np.array([103.939, 116.779, 123.68], dtype=np.float32)
+
+_buffers = threading.local()
+_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="upload-writer")
+
+
+def _thread_buffer():
+    buffer = getattr(_buffers, "image", None)
+    if buffer is None:
+        buffer = _buffers.image = np.empty(IMAGE_SIZE + (3,), dtype=np.float32)
+    return buffer
+
+
+def preprocess_input(x):
+    """ResNet "caffe" preprocessing without importing TensorFlow.
+
+    Matches keras.applications.resnet.preprocess_input for float arrays: the
+    channels are flipped to BGR (as a view) and the means are subtracted in place.
+    """
+    x = x[..., ::-1]
+    x -= _RESNET_MEAN_BGR
+    return x
+
+
+def decode_image(data, preprocess, out=None):
+    """Decode uploaded image bytes straight into a 224x224x3 float32 model input.
+
+    By default the pixels land in a buffer owned by the calling thread, so the
+    result is only valid until that thread decodes its next image. Pass `out`
+    to decode into a caller-owned array instead.
+    """
+    # Same pixels as the original Image.open(...).resize() path: no JPEG draft
+    # downscaling, and alpha is dropped after resizing
+    image = Image.open(io.BytesIO(data)).resize(IMAGE_SIZE).convert("RGB")
+
+    buffer = _thread_buffer() if out is None else out
+    np.copyto(buffer, np.asarray(image), casting="unsafe")
+    # ResNet preprocessing works on float arrays in place and returns a view of the buffer
+    return preprocess(buffer)
+
+
+def write_upload(data, file_path):
+    """Atomically write the upload to `file_path`."""
+    directory = os.path.dirname(file_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, file_path)
+
+
+def save_upload_async(data, file_path):
+    """Persist the original upload on a background writer thread."""
+    return _writer.submit(write_upload, data, file_path)
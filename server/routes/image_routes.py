@@ -1,25 +1,163 @@
-from flask import jsonify, request
+from flask import Response, jsonify, request, stream_with_context
+import base64
+import json
 import os
+import time
+import zipfile
 import numpy as np
-from tensorflow.keras.models import load_model # type: ignore
-from tensorflow.keras.applications.resnet import preprocess_input # type: ignore
-from PIL import Image
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload
 from werkzeug.utils import secure_filename
-from models import DiseaseInfo, db, ScanRecord
+from models import (
+    DiseaseInfo, db, ScanJob, ScanRecord, ScanDiseaseCount, ScanUserCount, ScanDailyCount,
+    get_uuid, record_scan_rollups, backfill_scan_rollups, bump_data_version
+)
 from flask import session
 from datetime import datetime
+from routes.inference import CLASS_NAMES, DEFAULT_MODEL_PATH, BatchScheduler, InferenceUnavailable, ModelWarmup
+from routes.inference_backends import load_backend
+from routes.model_client import ModelClient, ModelServerError, ModelServerUnavailable
+from routes.image_pipeline import decode_image, preprocess_input
+from routes.scan_cache import ContentStore, PredictionCache, content_hash
+from routes.scan_jobs import ScanJobWorker
+from routes.disease_cache import DISEASE_INFO_VERSION, DiseaseInfoCache
 
 
 def init_image_routes(app):
-    # Load your trained model
-    model_path = os.path.abspath("saved_models/CacaoScanner_best_v1.h5")
-    if not os.path.exists(model_path):
-        raise ValueError(f"File not found: filepath={model_path}. Please ensure the file exists.")
-    
-    model = load_model(model_path, compile=False)
-    model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    model_path = app.config.get('MODEL_PATH', DEFAULT_MODEL_PATH)
+    backend_kind = app.config.get('INFERENCE_BACKEND', 'keras')
+    model_socket = app.config.get('MODEL_SERVER_SOCKET')
+    client = None
+    if model_socket:
+        try:
+            client = ModelClient(model_socket)
+        except ModelServerError as e:
+            app.logger.warning(f"Model server disabled: {e}")
+
+    def build_local_scheduler():
+        backend = load_backend(backend_kind, model_path, app.config.get('INFERENCE_THREADS'))
+
+        # Concurrent uploads share one forward pass per batch
+        return BatchScheduler(
+            backend.predict,
+            max_batch_size=app.config.get('INFERENCE_MAX_BATCH_SIZE', 8),
+            max_wait_ms=app.config.get('INFERENCE_MAX_WAIT_MS', 10),
+            queue_depth=app.config.get('INFERENCE_QUEUE_DEPTH', 64)
+        )
+
+    # The in-process model loads in the background so the app can serve other
+    # routes right away; with a healthy model server it is only loaded on fallback
+    local = ModelWarmup(build_local_scheduler, retry_seconds=app.config.get('SCANNER_RETRY_SECONDS', 30))
+    ready_timeout = app.config.get('SCANNER_READY_TIMEOUT', 30)
+    warmup_checked = False
+
+    # Checked on the first request, so CLI processes (`flask db upgrade`,
+    # `flask batch-forecast`) and pool children never load a model copy
+    @app.before_request
+    def start_model_warmup():
+        nonlocal warmup_checked
+        if warmup_checked:
+            return
+        warmup_checked = True
+        if client is None or not client.is_healthy():
+            if client is not None:
+                app.logger.warning(f"Model server at {model_socket} is not reachable, using in-process inference")
+            local.start()
+
+    def predict_image(image):
+        """Return (prediction, queue_wait_ms) from the model server or the local model."""
+        if client is not None:
+            try:
+                return client.predict(image)
+            except ModelServerUnavailable as e:
+                # Only an unreachable daemon justifies loading a model copy in this worker;
+                # busy and inference error replies are passed on to the caller
+                app.logger.warning(f"Model server unreachable, falling back to in-process inference: {e}")
+        return local.get(ready_timeout).predict(image)
+
+    def predict_images(images):
+        """Batch variant of predict_image for a stacked array of images."""
+        if client is not None:
+            try:
+                return client.predict_batch(images)
+            except ModelServerUnavailable as e:
+                # Only an unreachable daemon justifies loading a model copy in this worker;
+                # busy and inference error replies are passed on to the caller
+                app.logger.warning(f"Model server unreachable, falling back to in-process inference: {e}")
+        return local.get(ready_timeout).predict_batch(images)
+
+    def inference_error_status(error):
+        """HTTP status for an inference failure that did not fall back to the local model."""
+        if isinstance(error, InferenceUnavailable):
+            return 503
+        return 400 if getattr(error, "code", None) == "bad_request" else 500
+
+    def scanner_ready():
+        return local.ready or (client is not None and client.is_healthy())
+
+    def describe_prediction(prediction, disease_info):
+        """Build the scan response fields for a model output row.
+
+        `disease_info` maps disease names to DiseaseInfo.to_dict() values.
+        """
+        predicted_class_index = np.argmax(prediction)
+        predicted_class = CLASS_NAMES[predicted_class_index]
+        confidence = prediction[predicted_class_index]
+
+        info = disease_info.get(predicted_class)
+        if not info:
+            info = {
+                "prevention": "No information available.",
+                "cause": "No information available.",
+                "contributing_factors": "No information available.",
+                "more_info_url": "N/A"
+            }
+        return {
+            "disease": predicted_class,
+            "confidence": float(confidence * 100),
+            "prevention": info["prevention"],
+            "cause": info["cause"],
+            "contributing_factors": info["contributing_factors"],
+            "more_info_url": info["more_info_url"],
+        }
+
+    prediction_cache = PredictionCache(
+        model_path,
+        maxsize=app.config.get('PREDICTION_CACHE_SIZE', 1024),
+        ttl=app.config.get('PREDICTION_CACHE_TTL', 3600)
+    )
+    image_store = ContentStore(app.config.get('SCAN_STORE_DIR', 'uploads/scanned_images'))
+    disease_cache = DiseaseInfoCache()
+
+    @app.route("/api/inference_stats", methods=["GET"])
+    def inference_stats():
+        return jsonify({
+            "prediction_cache": prediction_cache.stats(),
+            "image_store": image_store.stats(),
+        })
 
-    CLASS_NAMES = ["Vascular Streak Dieback (VSD)", "N/A", "Unrecognize", "Cacao Early Blight", "N/A", "Cacao Late Blight", "Cacao Leaf Spot"]
+    @app.route("/api/model_health", methods=["GET"])
+    def model_health():
+        response = {"in_process_model": local.stats(), "backend": backend_kind}
+        if client is not None:
+            try:
+                response["model_server"] = client.health()
+            except ModelServerError as e:
+                response["model_server"] = {"status": "unavailable", "error": str(e)}
+        ready = local.ready or response.get("model_server", {}).get("status") == "ready"
+        return jsonify(response), 200 if ready else 503
+
+    @app.route("/api/ready", methods=["GET"])
+    def readiness():
+        # Cheap readiness probe, non-ML routes are served while the scanner warms up
+        ready = scanner_ready()
+        return jsonify({"scanner": "ready" if ready else local.status}), 200 if ready else 503
+
+    @app.cli.command("backfill-scan-rollups")
+    def backfill_scan_rollups_command():
+        """Rebuild the scan statistics rollup tables from scan_records."""
+        backfill_scan_rollups()
+        print("Scan rollups rebuilt.")
 
     @app.route("/api/get_scan_counts", methods=["GET"])
     def get_scan_counts():
@@ -27,22 +165,20 @@ def init_image_routes(app):
             # Get today's date
             today = datetime.utcnow().date()
 
+            # Read the rollup tables instead of counting scan_records
             # Get total scans (for all users)
-            total_scans = db.session.query(ScanRecord).count()
+            total_scans = db.session.query(db.func.coalesce(db.func.sum(ScanDiseaseCount.count), 0)).scalar()
 
             # Get scans today for the specific user (if logged in)
             user_id = session.get("user_id", None)
             scans_today = 0
             total_user_scans = 0  # Total scans by this user
             if user_id:
-                scans_today = db.session.query(ScanRecord).filter(
-                    db.func.date(ScanRecord.created_at) == today,
-                    ScanRecord.user_id == user_id
-                ).count()
+                daily = db.session.get(ScanDailyCount, (today, user_id))
+                scans_today = daily.count if daily else 0
                 # Calculate total scans for the user
-                total_user_scans = db.session.query(ScanRecord).filter(
-                    ScanRecord.user_id == user_id
-                ).count()
+                user_count = db.session.get(ScanUserCount, user_id)
+                total_user_scans = user_count.count if user_count else 0
 
             return jsonify({
                 "total_scans": total_scans,
@@ -59,11 +195,10 @@ def init_image_routes(app):
     @app.route("/api/get_disease_counts", methods=["GET"])
     def get_disease_counts():
         try:
-            # Query all records excluding healthy classifications
+            # Read the per-disease rollup, excluding healthy classifications
             diseases = (
-                db.session.query(ScanRecord.disease, db.func.count(ScanRecord.disease))
-                .filter(~ScanRecord.disease.in_(["N/A", "Unrecognize"]))
-                .group_by(ScanRecord.disease)
+                db.session.query(ScanDiseaseCount.disease, ScanDiseaseCount.count)
+                .filter(~ScanDiseaseCount.disease.in_(["N/A", "Unrecognize"]), ScanDiseaseCount.count > 0)
                 .all()
             )
 
@@ -80,6 +215,102 @@ def init_image_routes(app):
             return jsonify({"error": str(e)}), 500
 
             
+    def classify(data, image_hash):
+        """Return (prediction, queue_wait_ms), serving repeated images from the prediction cache."""
+        prediction = prediction_cache.get(image_hash)
+        if prediction is not None:
+            return prediction, 0.0
+
+        # Decode straight from the request body, the original is written to disk later
+        image = decode_image(data, preprocess_input)
+
+        # Predict using the model (batched with other in-flight uploads)
+        started = time.perf_counter()
+        prediction, queue_wait_ms = predict_image(image)
+        inference_seconds = time.perf_counter() - started - queue_wait_ms / 1000.0
+        prediction_cache.put(image_hash, np.array(prediction), max(inference_seconds, 0.0))
+        return prediction, queue_wait_ms
+
+    def run_scan_job(job):
+        with open(job.image_path, "rb") as f:
+            data = f.read()
+        prediction, _ = classify(data, job.image_hash)
+
+        result = describe_prediction(prediction, disease_cache.by_name())
+
+        # Committed together with the job status by the worker
+        created_at = datetime.utcnow()
+        db.session.add(ScanRecord(image_path=job.image_path, disease=result["disease"], user_id=job.user_id, created_at=created_at))
+        record_scan_rollups([(job.user_id, result["disease"], created_at)])
+        return result
+
+    job_worker = None
+    if app.config.get('SCAN_JOB_WORKERS', 2) > 0:
+        job_worker = ScanJobWorker(
+            app,
+            run_scan_job,
+            workers=app.config.get('SCAN_JOB_WORKERS', 2),
+            poll_seconds=app.config.get('SCAN_JOB_POLL_SECONDS', 1.0),
+            max_attempts=app.config.get('SCAN_JOB_MAX_ATTEMPTS', 3),
+            stale_seconds=app.config.get('SCAN_JOB_STALE_SECONDS', 300),
+            retry_seconds=app.config.get('SCAN_JOB_RETRY_SECONDS', 10)
+        )
+
+        # Started by the first request, like the mail sender, so CLI processes
+        # never poll a `scan_jobs` table that may not exist yet
+        @app.before_request
+        def start_scan_job_worker():
+            job_worker.start()
+
+    @app.route("/api/scan_jobs/<job_id>", methods=["GET"])
+    def get_scan_job(job_id):
+        job = db.session.get(ScanJob, job_id)
+        if job is None or (job.user_id and job.user_id != session.get("user_id")):
+            return jsonify({"error": "Scan job not found"}), 404
+        return jsonify(job.to_dict()), 200
+
+    def encode_scan_cursor(scan):
+        return base64.urlsafe_b64encode(f"{scan.created_at.isoformat()}|{scan.id}".encode()).decode()
+
+    def decode_scan_cursor(cursor):
+        created_at, scan_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), scan_id
+
+    @app.route("/api/scans", methods=["GET"])
+    def list_scans():
+        """The user's scan history, newest first, in keyset-paginated pages."""
+        user_id = session.get("user_id")
+        if not user_id:
+            return jsonify({"error": "Unauthorized"}), 401
+
+        limit = min(max(request.args.get("limit", 50, type=int), 1), 100)
+        query = (
+            ScanRecord.query
+            .options(joinedload(ScanRecord.disease_info))
+            .filter(ScanRecord.user_id == user_id, ScanRecord.created_at.isnot(None))
+        )
+        cursor = request.args.get("cursor")
+        if cursor:
+            try:
+                created_at, scan_id = decode_scan_cursor(cursor)
+            except (ValueError, UnicodeDecodeError):
+                return jsonify({"error": "Invalid cursor"}), 400
+            # Seek past the last row of the previous page instead of OFFSET
+            query = query.filter(db.tuple_(ScanRecord.created_at, ScanRecord.id) < db.tuple_(created_at, scan_id))
+
+        scans = (
+            query
+            .order_by(ScanRecord.created_at.desc(), ScanRecord.id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+        has_more = len(scans) > limit
+        scans = scans[:limit]
+        return jsonify({
+            "scans": [scan.to_dict() for scan in scans],
+            "next_cursor": encode_scan_cursor(scans[-1]) if has_more else None
+        }), 200
+
     @app.route("/api/upload_image", methods=["POST"])
     def upload_image():
         try:
@@ -90,66 +321,194 @@ def init_image_routes(app):
             if not image_file.filename.lower().endswith(('png', 'jpg', 'jpeg')):
                 return jsonify({"error": "Invalid file type"}), 400
 
-            save_dir = "uploads/scanned_images"
-            os.makedirs(save_dir, exist_ok=True)
-            filename = secure_filename(image_file.filename)
-            file_path = os.path.join(save_dir, filename)
-            image_file.save(file_path)
-
-            # Process the image
-            image = Image.open(file_path)
-            image = image.resize((224, 224))
-            image = np.array(image)
-            if image.shape[2] == 4:
-                image = image[..., :3]
-            image = preprocess_input(image)
-            img_batch = np.expand_dims(image, 0)
-
-            # Predict using the model
-            predictions = model.predict(img_batch)
-            predicted_class_index = np.argmax(predictions[0])
-            predicted_class = CLASS_NAMES[predicted_class_index]
-            confidence = predictions[0][predicted_class_index]
-
-            # Fetch disease info from the database
-            disease_info = DiseaseInfo.query.filter_by(name=predicted_class).first()
-            if not disease_info:
-                disease_info = DiseaseInfo(
-                    name=predicted_class,
-                    prevention="No information available.",
-                    cause="No information available.",
-                    contributing_factors="No information available.",
-                    more_info_url="N/A"
-                )
+            # Identical photos map to the same stored file and cached prediction
+            max_bytes = app.config.get('MAX_IMAGE_BYTES', 20 * 1024 * 1024)
+            data = image_file.stream.read(max_bytes + 1)
+            if len(data) > max_bytes:
+                return jsonify({"error": "Image is too large"}), 400
+            image_hash = content_hash(data)
+            file_path = image_store.path_for(image_hash, os.path.splitext(secure_filename(image_file.filename))[1])
+
+            if request.args.get('async', request.form.get('async', '')).lower() in ('1', 'true'):
+                # Queue the scan and let the job workers do the inference
+                image_store.save(data, file_path)
+                job = ScanJob(image_path=file_path, image_hash=image_hash, user_id=session.get("user_id", None))
+                db.session.add(job)
+                db.session.commit()
+                if job_worker is not None:
+                    job_worker.notify()
+                return jsonify({"job_id": job.id, "status": job.status, "status_url": f"/api/scan_jobs/{job.id}"}), 202
+
+            try:
+                prediction, queue_wait_ms = classify(data, image_hash)
+            except (InferenceUnavailable, ModelServerError) as e:
+                return jsonify({"error": str(e)}), inference_error_status(e)
+
+            # Disease info comes from the process cache, not the database
+            result = describe_prediction(prediction, disease_cache.by_name())
 
             # Save the scan result to the database
             user_id = session.get("user_id", None)
+            created_at = datetime.utcnow()
             scan_record = ScanRecord(
                 image_path=file_path,
-                disease=predicted_class,
-                user_id=user_id
+                disease=result["disease"],
+                user_id=user_id,
+                created_at=created_at
             )
             db.session.add(scan_record)
+            record_scan_rollups([(user_id, result["disease"], created_at)])
             db.session.commit()
 
             # Return the prediction and disease details
-            return jsonify({
-                "disease": predicted_class,
-                "confidence": float(confidence * 100),
-                "prevention": disease_info.prevention,
-                "cause": disease_info.cause,
-                "contributing_factors": disease_info.contributing_factors,
-                "more_info_url": disease_info.more_info_url,
-            }), 201
+            result["queue_wait_ms"] = round(queue_wait_ms, 2)
+            response = jsonify(result)
+            response.call_on_close(lambda: image_store.save_async(data, file_path))
+            return response, 201
 
         except Exception as e:
             return jsonify({"error": str(e)}), 500
         
+    def collect_bulk_uploads():
+        """Return [(filename, bytes)] from the multipart `images` fields and an optional `archive` zip."""
+        max_images = app.config.get('BULK_SCAN_MAX_IMAGES', 200)
+        max_bytes = app.config.get('MAX_IMAGE_BYTES', 20 * 1024 * 1024)
+        too_many = f"At most {max_images} images can be scanned per request"
+        uploads = []
+        for image_file in request.files.getlist('images'):
+            if not image_file.filename:
+                continue
+            # Same checks as upload_image and the zip members below
+            if not image_file.filename.lower().endswith(('png', 'jpg', 'jpeg')):
+                raise ValueError(f"{image_file.filename}: invalid file type")
+            data = image_file.stream.read(max_bytes + 1)
+            if len(data) > max_bytes:
+                raise ValueError(f"{image_file.filename} is too large")
+            uploads.append((image_file.filename, data))
+            if len(uploads) > max_images:
+                break
+
+        archive = request.files.get('archive')
+        if archive and archive.filename:
+            if not archive.filename.lower().endswith('.zip'):
+                raise ValueError("Archive must be a .zip file")
+            with zipfile.ZipFile(archive.stream) as bundle:
+                for member in bundle.infolist():
+                    if member.is_dir() or not member.filename.lower().endswith(('png', 'jpg', 'jpeg')):
+                        continue
+                    if member.file_size > max_bytes:
+                        raise ValueError(f"{member.filename} is too large")
+                    if len(uploads) >= max_images:
+                        raise ValueError(too_many)
+                    uploads.append((os.path.basename(member.filename), bundle.read(member)))
+
+        if len(uploads) > max_images:
+            raise ValueError(too_many)
+        return uploads
+
+    @app.route("/api/upload_images", methods=["POST"])
+    def upload_images():
+        try:
+            uploads = collect_bulk_uploads()
+        except (ValueError, zipfile.BadZipFile) as e:
+            return jsonify({"error": str(e)}), 400
+        if not uploads:
+            return jsonify({"error": "No image files provided"}), 400
+
+        user_id = session.get("user_id", None)
+        disease_info = disease_cache.by_name()
+        batch_size = app.config.get('INFERENCE_MAX_BATCH_SIZE', 8)
+
+        def scan_chunk(chunk):
+            """Yield (index, filename, data, image_hash, prediction or error) for one chunk."""
+            hashes = [content_hash(data) for _, _, data in chunk]
+            predictions = [prediction_cache.get(image_hash) for image_hash in hashes]
+            errors = [None] * len(chunk)
+
+            # Decode every cache miss into one preallocated batch tensor
+            pending = [i for i, prediction in enumerate(predictions) if prediction is None]
+            images = np.empty((len(pending), 224, 224, 3), dtype=np.float32)
+            decoded = []
+            for i in pending:
+                try:
+                    images[len(decoded)] = decode_image(chunk[i][2], preprocess_input)
+                    decoded.append(i)
+                except Exception as e:
+                    errors[i] = f"Could not decode image: {e}"
+
+            if decoded:
+                started = time.perf_counter()
+                outputs, queue_wait_ms = predict_images(images[:len(decoded)])
+                inference_seconds = max(time.perf_counter() - started - queue_wait_ms / 1000.0, 0.0)
+                for i, output in zip(decoded, outputs):
+                    predictions[i] = np.array(output)
+                    prediction_cache.put(hashes[i], predictions[i], inference_seconds / len(decoded))
+
+            for (index, filename, data), image_hash, prediction, error in zip(chunk, hashes, predictions, errors):
+                yield index, filename, data, image_hash, prediction, error
+
+        def save_chunk(rows):
+            """Insert one chunk's scan records; they are committed before the client sees them."""
+            db.session.execute(insert(ScanRecord), rows)
+            record_scan_rollups([(row["user_id"], row["disease"], row["created_at"]) for row in rows])
+            db.session.commit()
+
+        def generate():
+            saved = 0
+            indexed = [(index, filename, data) for index, (filename, data) in enumerate(uploads)]
+            for start in range(0, len(indexed), batch_size):
+                try:
+                    scanned = list(scan_chunk(indexed[start:start + batch_size]))
+                except (InferenceUnavailable, ModelServerError) as e:
+                    yield json.dumps({"error": str(e), "status": inference_error_status(e), "completed": saved}) + "\n"
+                    break
+
+                rows, files, lines = [], [], []
+                for index, filename, data, image_hash, prediction, error in scanned:
+                    if error:
+                        lines.append({"index": index, "filename": filename, "error": error})
+                        continue
+                    file_path = image_store.path_for(image_hash, os.path.splitext(secure_filename(filename))[1])
+                    result = describe_prediction(prediction, disease_info)
+                    rows.append({
+                        "id": get_uuid(),
+                        "user_id": user_id,
+                        "image_path": file_path,
+                        "disease": result["disease"],
+                        "created_at": datetime.utcnow(),
+                    })
+                    files.append((data, file_path))
+                    lines.append({"index": index, "filename": filename, **result})
+
+                # Commit per chunk so a client that disconnects mid-stream keeps
+                # every scan it has already received
+                if rows:
+                    try:
+                        save_chunk(rows)
+                    except Exception as e:
+                        db.session.rollback()
+                        yield json.dumps({"error": f"Could not save scan records: {e}", "saved": saved}) + "\n"
+                        return
+                    saved += len(rows)
+                    for data, file_path in files:
+                        image_store.save_async(data, file_path)
+
+                for line in lines:
+                    yield json.dumps(line) + "\n"
+
+            yield json.dumps({"saved": saved, "total": len(uploads)}) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
     @app.route("/api/diseases", methods=["GET", "POST", "PUT", "DELETE"])
     def manage_diseases():
         if request.method == "GET":
-            diseases = DiseaseInfo.query.all()
-            return jsonify([disease.to_dict() for disease in diseases])
+            # Served from the process cache; clients polling with If-None-Match get a 304
+            etag, diseases, _ = disease_cache.snapshot()
+            response = jsonify(diseases)
+            response.set_etag(f"disease-info-{etag}")
+            response.headers["Cache-Control"] = "no-cache"
+            return response.make_conditional(request)
 
         if request.method == "POST":
             data = request.json
@@ -161,7 +520,9 @@ def init_image_routes(app):
                 more_info_url=data.get("more_info_url", "")
             )
             db.session.add(new_disease)
+            bump_data_version(DISEASE_INFO_VERSION)
             db.session.commit()
+            disease_cache.invalidate()
             return jsonify(new_disease.to_dict()), 201
 
         if request.method == "PUT":
@@ -173,7 +534,9 @@ def init_image_routes(app):
             disease.cause = data.get("cause", disease.cause)
             disease.contributing_factors = data.get("contributing_factors", disease.contributing_factors)
             disease.more_info_url = data.get("more_info_url", disease.more_info_url)
+            bump_data_version(DISEASE_INFO_VERSION)
             db.session.commit()
+            disease_cache.invalidate()
             return jsonify(disease.to_dict())
 
         if request.method == "DELETE":
@@ -182,5 +545,7 @@ def init_image_routes(app):
             if not disease:
                 return jsonify({"error": "Disease not found"}), 404
             db.session.delete(disease)
+            bump_data_version(DISEASE_INFO_VERSION)
             db.session.commit()
+            disease_cache.invalidate()
             return jsonify({"message": "Disease deleted"}), 200
\ No newline at end of file
@@ -0,0 +1,208 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+DEFAULT_MODEL_PATH = "saved_models/CacaoScanner_best_v1.h5"
+
+CLASS_NAMES = ["Vascular Streak Dieback (VSD)", "N/A", "Unrecognize", "Cacao Early Blight", "N/A", "Cacao Late Blight", "Cacao Leaf Spot"]
+
+
+def load_scanner_model(model_path=DEFAULT_MODEL_PATH):
+    """Load and compile the CacaoScanner Keras model."""
+    from tensorflow.keras.models import load_model # type: ignore
+
+    model_path = os.path.abspath(model_path)
+    if not os.path.exists(model_path):
+        raise ValueError(f"File not found: filepath={model_path}. Please ensure the file exists.")
+
+    model = load_model(model_path, compile=False)
+    model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    return model
+
+
+class InferenceUnavailable(Exception):
+    """Base class for temporary inference failures (reported as 503)."""
+
+
+class SchedulerBusy(InferenceUnavailable):
+    """Raised when the inference queue is full."""
+
+
+class ScannerNotReady(InferenceUnavailable):
+    """Raised while the model is still loading or after it failed to load."""
+
+
+class ModelWarmup:
+    """Build the model scheduler on a background thread and track its readiness.
+
+    `load_fn` returns a BatchScheduler; a dummy inference is run through it
+    before the scanner is reported ready so the first real scan is not slow.
+    After a failed load, new attempts wait `retry_seconds` (doubling on each
+    failure up to `max_retry_seconds`) so requests don't each reload the model.
+    """
+
+    def __init__(self, load_fn, input_shape=(224, 224, 3), retry_seconds=30, max_retry_seconds=600):
+        self._load_fn = load_fn
+        self._input_shape = input_shape
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.failures = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self.status = "idle"  # idle, loading, ready, failed
+        self.error = None
+        self.load_seconds = None
+        self.scheduler = None
+
+    def start(self):
+        with self._lock:
+            if self.status in ("loading", "ready"):
+                return
+            if self.status == "failed" and time.monotonic() < self._retry_at:
+                return
+            self.status = "loading"
+            self.error = None
+            self._done.clear()
+        threading.Thread(target=self._load, name="model-warmup", daemon=True).start()
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            scheduler = self._load_fn()
+            scheduler.predict(np.zeros(self._input_shape, dtype=np.float32))
+            self.scheduler = scheduler
+            self.failures = 0
+            self.status = "ready"
+        except Exception as e:
+            self.error = str(e)
+            self.failures += 1
+            backoff = min(self.retry_seconds * 2 ** (self.failures - 1), self.max_retry_seconds)
+            self._retry_at = time.monotonic() + backoff
+            self.status = "failed"
+        finally:
+            self.load_seconds = round(time.perf_counter() - started, 2)
+            self._done.set()
+
+    @property
+    def ready(self):
+        return self.status == "ready"
+
+    def get(self, timeout=None):
+        """Return the scheduler, starting the load if needed and waiting up to `timeout` seconds."""
+        if not self.ready:
+            self.start()
+            if self.status == "loading":
+                self._done.wait(timeout)
+        if not self.ready:
+            raise ScannerNotReady(f"Scanner is {self.status}, please retry shortly." if not self.error else f"Scanner failed to load: {self.error}")
+        return self.scheduler
+
+    def stats(self):
+        response = {"status": self.status, "load_seconds": self.load_seconds}
+        if self.error:
+            response["error"] = self.error
+        if self.status == "failed":
+            response["retry_in_seconds"] = round(max(self._retry_at - time.monotonic(), 0), 1)
+        if self.ready:
+            response["scheduler"] = self.scheduler.stats()
+        return response
+
+
+class BatchScheduler:
+    """Collect concurrent inference requests and run them as one batch.
+
+    A background thread pulls requests off a bounded queue and flushes them to
+    `predict_fn` as a single stacked tensor once `max_batch_size` images are
+    waiting or the oldest request has waited `max_wait_ms`.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=10, queue_depth=64):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue(maxsize=max(1, int(queue_depth)))
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self._worker = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, image):
+        """Queue one preprocessed image and return a Future of (prediction, queue_wait_ms)."""
+        return self._enqueue(np.expand_dims(image, 0), single=True)
+
+    def submit_batch(self, images):
+        """Queue an already stacked batch and return a Future of (predictions, queue_wait_ms)."""
+        return self._enqueue(np.asarray(images), single=False)
+
+    def _enqueue(self, images, single):
+        future = Future()
+        try:
+            self._queue.put_nowait((images, time.perf_counter(), future, single))
+        except queue.Full:
+            raise SchedulerBusy("Inference queue is full, please retry shortly.")
+        return future
+
+    def predict(self, image, timeout=None):
+        """Blocking helper around `submit`."""
+        return self.submit(image).result(timeout=timeout)
+
+    def predict_batch(self, images, timeout=None):
+        """Blocking helper around `submit_batch`."""
+        return self.submit_batch(images).result(timeout=timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+                "queue_size": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._queue.maxsize,
+            }
+
+    def _collect(self):
+        # Block for the first request, then keep gathering until the batch is full
+        # or the first request has used up its wait budget
+        batch = [self._queue.get()]
+        rows = len(batch[0][0])
+        deadline = batch[0][1] + self.max_wait
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+            rows += len(batch[-1][0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                predictions = self.predict_fn(np.concatenate([images for images, _, _, _ in batch]))
+            except Exception as e:
+                for _, _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(predictions)
+
+            offset = 0
+            for images, enqueued_at, future, single in batch:
+                result = predictions[offset:offset + len(images)]
+                offset += len(images)
+                future.set_result((result[0] if single else result, (started - enqueued_at) * 1000.0))
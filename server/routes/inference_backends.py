@@ -0,0 +1,124 @@
+import os
+import threading
+
+import numpy as np
+
+from routes.inference import CLASS_NAMES, load_scanner_model
+
+BACKENDS = ("keras", "tflite", "onnx")
+
+
+class KerasBackend:
+    name = "keras"
+
+    def __init__(self, model_path):
+        self.model = load_scanner_model(model_path)
+
+    def predict(self, batch):
+        return self.model.predict(batch, verbose=0)
+
+
+class TFLiteBackend:
+    """Runs an exported .tflite artifact (float16 or int8 quantized)."""
+
+    name = "tflite"
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter # type: ignore
+        except ImportError:
+            from tensorflow.lite import Interpreter # type: ignore
+
+        if not os.path.exists(model_path):
+            raise ValueError(f"File not found: filepath={model_path}. Please ensure the file exists.")
+        with open(model_path, "rb") as f:
+            self._model_content = f.read()  # Shared by the interpreters of every batch size
+        self._interpreter_cls = Interpreter
+        self.num_threads = num_threads or os.cpu_count()
+        self._interpreters = {}
+        self._lock = threading.Lock()  # Interpreters are not thread-safe
+        self._interpreter_for(1)
+
+    def _interpreter_for(self, batch_size):
+        # Micro-batches come in every size up to max_batch_size; resizing one
+        # interpreter reallocates its tensors on almost every call, so keep one per size
+        interpreter = self._interpreters.get(batch_size)
+        if interpreter is None:
+            interpreter = self._interpreter_cls(model_content=self._model_content, num_threads=self.num_threads)
+            input_detail = interpreter.get_input_details()[0]
+            if input_detail["shape"][0] != batch_size:
+                interpreter.resize_tensor_input(input_detail["index"], [batch_size, *input_detail["shape"][1:]])
+            interpreter.allocate_tensors()
+            self._interpreters[batch_size] = interpreter
+        return interpreter
+
+    def predict(self, batch):
+        with self._lock:
+            interpreter = self._interpreter_for(len(batch))
+            input_detail = interpreter.get_input_details()[0]
+
+            if input_detail["dtype"] == np.int8:
+                # Fully integer models expect quantized inputs
+                scale, zero_point = input_detail["quantization"]
+                batch = np.round(batch / scale + zero_point).clip(-128, 127)
+            interpreter.set_tensor(input_detail["index"], batch.astype(input_detail["dtype"]))
+            interpreter.invoke()
+
+            output_detail = interpreter.get_output_details()[0]
+            output = interpreter.get_tensor(output_detail["index"])
+            if output_detail["dtype"] == np.int8:
+                scale, zero_point = output_detail["quantization"]
+                output = (output.astype(np.float32) - zero_point) * scale
+            return output
+
+
+class ONNXBackend:
+    name = "onnx"
+
+    def __init__(self, model_path, num_threads=None):
+        import onnxruntime as ort # type: ignore
+
+        if not os.path.exists(model_path):
+            raise ValueError(f"File not found: filepath={model_path}. Please ensure the file exists.")
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        return self.session.run(None, {self.input_name: batch.astype(np.float32)})[0]
+
+
+def load_backend(kind, model_path, num_threads=None):
+    """Load the CacaoScanner model with the requested inference backend."""
+    if kind == "keras":
+        return KerasBackend(model_path)
+    if kind == "tflite":
+        return TFLiteBackend(model_path, num_threads=num_threads)
+    if kind == "onnx":
+        return ONNXBackend(model_path, num_threads=num_threads)
+    raise ValueError(f"Unknown inference backend '{kind}'. Expected one of: {', '.join(BACKENDS)}")
+
+
+def load_labelled_samples(root):
+    """Yield (file_path, class_index) for images under `root/<class>/`.
+
+    Class folders are named by class index ("0", "3", ...) or by class name.
+    Names shared by several classes ("N/A") are ambiguous and need the index.
+    """
+    for entry in sorted(os.listdir(root)):
+        class_dir = os.path.join(root, entry)
+        if not os.path.isdir(class_dir):
+            continue
+        if entry.isdigit() and int(entry) < len(CLASS_NAMES):
+            label = int(entry)
+        elif CLASS_NAMES.count(entry) == 1:
+            label = CLASS_NAMES.index(entry)
+        elif entry in CLASS_NAMES:
+            raise ValueError(f"Class folder '{entry}' matches several classes, name it by class index instead")
+        else:
+            continue
+        for filename in sorted(os.listdir(class_dir)):
+            if filename.lower().endswith(('png', 'jpg', 'jpeg')):
+                yield os.path.join(class_dir, filename), label
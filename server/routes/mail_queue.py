@@ -0,0 +1,138 @@
+import json
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+
+from flask_mail import Message
+
+from models import db, OutboundEmail
+
+
+def queue_email(subject, sender, recipients, body):
+    """Add a message to the outbound queue; it is sent once the caller commits."""
+    email = OutboundEmail(sender=sender, recipients=json.dumps(list(recipients)), subject=subject, body=body)
+    db.session.add(email)
+    return email
+
+
+class MailSender:
+    """Background sender draining the `outbound_emails` table.
+
+    Queued messages are claimed in batches with SELECT ... FOR UPDATE SKIP
+    LOCKED, so several processes can run a sender, and every batch is sent
+    over one SMTP connection. Failed messages are retried with exponential
+    backoff. For local testing point MAIL_SERVER/MAIL_PORT at a stand-in such
+    as `python -m aiosmtpd -n -l localhost:8025` with MAIL_USE_TLS=False.
+    """
+
+    def __init__(self, app, mail, poll_seconds=2.0, batch_size=20, max_attempts=5,
+                 backoff_seconds=30, stale_seconds=300):
+        self.app = app
+        self.mail = mail
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.stale_seconds = stale_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start the sender thread once; later calls do nothing."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="mail-sender", daemon=True)
+                self._thread.start()
+
+    def notify(self):
+        """Wake the sender after this process queued a message."""
+        self._wake.set()
+
+    def _claim(self):
+        now = datetime.utcnow()
+        stale_before = now - timedelta(seconds=self.stale_seconds)
+        emails = (
+            OutboundEmail.query
+            .filter(db.or_(
+                db.and_(OutboundEmail.status == 'queued', OutboundEmail.next_attempt_at <= now),
+                db.and_(OutboundEmail.status == 'sending', OutboundEmail.updated_at < stale_before)
+            ))
+            .order_by(OutboundEmail.next_attempt_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        for email in emails:
+            email.status = 'sending'
+            email.attempts += 1
+            email.updated_at = now
+        db.session.commit()
+        return emails
+
+    def _failed(self, email, error):
+        email.last_error = str(error)
+        email.updated_at = datetime.utcnow()
+        if email.attempts >= self.max_attempts:
+            email.status = 'failed'
+            email.body = None
+        else:
+            email.status = 'queued'
+            email.next_attempt_at = email.updated_at + timedelta(seconds=self.backoff_seconds * 2 ** (email.attempts - 1))
+        self.app.logger.warning(f"Email {email.id} to {email.recipients} failed (attempt {email.attempts}): {error}")
+
+    def _send_batch(self, connection, emails):
+        for email in emails:
+            try:
+                connection.send(Message(
+                    subject=email.subject,
+                    sender=email.sender,
+                    recipients=json.loads(email.recipients),
+                    body=email.body
+                ))
+            except Exception as e:
+                self._failed(email, e)
+            else:
+                email.status = 'sent'
+                email.body = None
+                email.last_error = None
+                email.sent_at = email.updated_at = datetime.utcnow()
+            db.session.commit()
+
+    def drain(self):
+        """Send everything that is due, reusing one SMTP connection. Returns the number handled."""
+        emails = self._claim()
+        if not emails:
+            return 0
+        handled = 0
+        try:
+            with self.mail.connect() as connection:
+                while emails:
+                    self._send_batch(connection, emails)
+                    handled += len(emails)
+                    emails = self._claim()
+        except Exception as e:
+            # Could not reach the server (or lost it): reschedule what is still claimed
+            db.session.rollback()
+            for email in emails:
+                email = db.session.get(OutboundEmail, email.id)
+                if email is not None and email.status == 'sending':
+                    self._failed(email, e)
+            db.session.commit()
+        return handled
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    if self.drain():
+                        continue
+            except Exception as e:
+                self.app.logger.error(f"Mail sender error: {e}")
+
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
@@ -0,0 +1,129 @@
+import json
+import socket
+import struct
+import threading
+
+import numpy as np
+
+from routes.inference import SchedulerBusy
+
+# Every message is a 4-byte big-endian header length, a JSON header and an
+# optional raw array payload described by the header's "shape" and "dtype".
+_HEADER = struct.Struct(">I")
+
+
+class ModelServerError(Exception):
+    """Raised when the inference daemon answers a request with an error."""
+
+    def __init__(self, message, code="inference_error"):
+        super().__init__(message)
+        self.code = code
+
+
+class ModelServerUnavailable(ModelServerError):
+    """Raised when the inference daemon cannot be reached at all."""
+
+    def __init__(self, message):
+        super().__init__(message, code="unavailable")
+
+
+def _recv_exact(sock, size):
+    chunks = bytearray()
+    while len(chunks) < size:
+        chunk = sock.recv(size - len(chunks))
+        if not chunk:
+            raise ConnectionError("Connection closed by peer")
+        chunks.extend(chunk)
+    return bytes(chunks)
+
+
+def send_message(sock, header, array=None):
+    if array is not None:
+        array = np.ascontiguousarray(array)
+        header = dict(header, shape=list(array.shape), dtype=str(array.dtype))
+    encoded = json.dumps(header).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(encoded)) + encoded)
+    if array is not None:
+        sock.sendall(memoryview(array).cast("B"))
+
+
+def recv_message(sock):
+    (length,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    header = json.loads(_recv_exact(sock, length).decode("utf-8"))
+    array = None
+    if "shape" in header:
+        dtype = np.dtype(header["dtype"])
+        size = int(np.prod(header["shape"])) * dtype.itemsize
+        array = np.frombuffer(_recv_exact(sock, size), dtype=dtype).reshape(header["shape"])
+    return header, array
+
+
+class ModelClient:
+    """Thin client for the local inference daemon (see model_server.py).
+
+    Each thread keeps its own persistent connection to the Unix socket.
+    """
+
+    def __init__(self, socket_path, timeout=30.0):
+        if not hasattr(socket, "AF_UNIX"):
+            raise ModelServerUnavailable("Unix sockets are not supported on this platform.")
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            finally:
+                self._local.sock = None
+
+    def _call(self, header, array=None):
+        # Retry once on a fresh connection in case the daemon was restarted
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                send_message(sock, header, array)
+                reply, result = recv_message(sock)
+                break
+            except (OSError, ValueError) as e:
+                self._close()
+                if attempt:
+                    raise ModelServerUnavailable(f"Model server unavailable: {e}")
+        if not reply.get("ok"):
+            # The daemon is up, so these are not a reason to load a local model
+            error = reply.get("error", "Unknown model server error")
+            if reply.get("code") == "busy":
+                raise SchedulerBusy(error)
+            raise ModelServerError(error, code=reply.get("code", "inference_error"))
+        return reply, result
+
+    def health(self):
+        reply, _ = self._call({"op": "health"})
+        return reply
+
+    def is_healthy(self):
+        try:
+            return self.health().get("status") == "ready"
+        except ModelServerError:
+            return False
+
+    def predict_batch(self, images):
+        """Predict a stacked batch of preprocessed images, returning (predictions, queue_wait_ms)."""
+        reply, result = self._call({"op": "predict"}, np.asarray(images, dtype=np.float32))
+        return result, reply.get("queue_wait_ms", 0.0)
+
+    def predict(self, image):
+        """Predict a single preprocessed image, returning (prediction, queue_wait_ms)."""
+        result, queue_wait_ms = self.predict_batch(np.expand_dims(image, 0))
+        return result[0], queue_wait_ms
@@ -0,0 +1,52 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+
+class HasherBusy(Exception):
+    """Too many password hashes are already queued."""
+
+
+def hash_cost(hashed_password):
+    """Cost factor stored in a bcrypt hash ($2b$<cost>$...)."""
+    try:
+        return int(hashed_password.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """bcrypt hashing and verification on a small bounded thread pool.
+
+    bcrypt releases the GIL, so `workers` caps how many cores logins can use
+    at once and the scanner keeps the rest. At most `queue_depth` operations
+    may be running or waiting; beyond that calls raise HasherBusy instead of
+    piling up request threads.
+    """
+
+    def __init__(self, rounds=12, workers=None, queue_depth=32):
+        self.rounds = rounds
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(queue_depth)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy("Too many authentication requests, please retry shortly")
+        try:
+            return self._pool.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        salt = bcrypt.gensalt(self.rounds)
+        return self._run(bcrypt.hashpw, password.encode("utf-8"), salt).decode("utf-8")
+
+    def check(self, hashed_password, password):
+        return self._run(bcrypt.checkpw, password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+    def needs_rehash(self, hashed_password):
+        """True when the stored hash was made with a different cost than configured."""
+        return hash_cost(hashed_password) != self.rounds
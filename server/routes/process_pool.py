@@ -0,0 +1,32 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def default_pool_workers():
+    """CPU cores per web worker process, so N gunicorn workers don't each claim every core.
+
+    The web worker count is read from WEB_CONCURRENCY, the variable gunicorn
+    uses for its own --workers default.
+    """
+    web_workers = max(1, int(os.getenv('WEB_CONCURRENCY', 1)))
+    return max(1, (os.cpu_count() or 1) // web_workers)
+
+
+def new_process_pool(workers=None):
+    """ProcessPoolExecutor that is safe to create from a process already running threads.
+
+    The app has batcher, warmup, job, mail and TensorFlow threads by the time
+    a pool is first needed; a fork then can leave children stuck on locks
+    those threads held. Children are started by a forkserver (a clean
+    process) where available, otherwise spawned. Either way they import the
+    entry module as `__mp_main__`, so it must not build an app or start
+    threads at import time under that name (app.py checks for it).
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        # Any preload makes the forkserver start with our sys.path, so `routes` imports in the children
+        context.set_forkserver_preload([__name__])
+    else:
+        context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=workers or default_pool_workers(), mp_context=context)
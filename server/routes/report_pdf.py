@@ -0,0 +1,170 @@
+import glob
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from jinja2 import Environment
+
+from routes.process_pool import new_process_pool
+
+REPORT_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<style>
+  @page { size: A4; margin: 18mm 15mm; }
+  body { font-family: sans-serif; font-size: 10pt; color: #222; }
+  h1 { font-size: 16pt; margin-bottom: 2mm; }
+  h2 { font-size: 12pt; margin-top: 8mm; }
+  .meta { color: #555; }
+  table { width: 100%; border-collapse: collapse; margin-top: 3mm; }
+  th, td { border-bottom: 1px solid #ddd; padding: 1.5mm 2mm; text-align: right; }
+  th:first-child, td:first-child { text-align: left; }
+  th { background: #f0f4ec; }
+  tr { page-break-inside: avoid; }
+</style>
+</head>
+<body>
+  <h1>LeafScan Cacao Production Report</h1>
+  <p class="meta">
+    Series: {{ series_id }} &middot; Severity: {{ report.severity_label }} ({{ report.severity_value }},
+    {{ report.loss_percentage }}% loss) &middot; Generated {{ generated_at }}
+  </p>
+
+  <h2>Forecast for the next 8 quarters</h2>
+  <table>
+    <tr><th>Quarter</th><th>Forecast</th><th>Adjusted production</th><th>Loss</th></tr>
+    {% for date, forecast, adjusted, loss in forecast_rows %}
+    <tr><td>{{ date }}</td><td>{{ "%.2f"|format(forecast) }}</td><td>{{ "%.2f"|format(adjusted) }}</td><td>{{ "%.2f"|format(loss) }}</td></tr>
+    {% endfor %}
+  </table>
+
+  <h2>Production history</h2>
+  <table>
+    <tr><th>Date</th><th>Production</th><th>Adjusted production</th><th>Loss</th></tr>
+    {% for row in report.data %}
+    <tr><td>{{ row.date }}</td><td>{{ "%.2f"|format(row.value) }}</td><td>{{ "%.2f"|format(row.adjusted_production) }}</td><td>{{ "%.2f"|format(row.loss) }}</td></tr>
+    {% endfor %}
+  </table>
+</body>
+</html>
+"""
+
+_template = Environment(autoescape=True).from_string(REPORT_TEMPLATE)
+
+
+class ReportRenderTimeout(Exception):
+    """The PDF did not finish rendering within the request timeout."""
+
+
+def render_report_html(report, series_id):
+    forecast_rows = list(zip(
+        report.get("forecast_dates") or [f"Q+{i + 1}" for i in range(len(report["next_8_quarters_forecast"]))],
+        report["next_8_quarters_forecast"],
+        report["adjusted_production"],
+        report["actual_losses"],
+    ))
+    return _template.render(
+        report=report,
+        series_id=series_id,
+        forecast_rows=forecast_rows,
+        generated_at=datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC"),
+    )
+
+
+def _write_pdf(html, path):
+    """Runs in a pool worker: render the HTML to `path` atomically."""
+    from weasyprint import HTML # Deferred, heavy import
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        HTML(string=html).write_pdf(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return path
+
+
+class ReportRenderer:
+    """Renders report PDFs on a process pool and keeps them on disk.
+
+    Files live in one directory per series and are named by data version
+    and severity, so a rendered report is reused until the series changes.
+    Concurrent requests for the same report wait on one render.
+    """
+
+    def __init__(self, root, workers=2, timeout=60):
+        self.root = root
+        self.workers = workers
+        self.timeout = timeout
+        os.makedirs(root, exist_ok=True)
+        self._pool = None
+        self._lock = threading.RLock()  # The done callback can run inside render() while it holds the lock
+        self._pending = {}
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = new_process_pool(self.workers)
+        return self._pool
+
+    def series_dir(self, series_id):
+        # Prefixed so ids such as "." or ".." stay inside the cache root
+        return os.path.join(self.root, f"series-{series_id}")
+
+    def path_for(self, series_id, version, severity):
+        return os.path.join(self.series_dir(series_id), f"report-v{version}-s{severity}.pdf")
+
+    def render(self, series_id, version, severity, build):
+        """Return (path, error, status); `build` returns the report data as (data, status)."""
+        path = self.path_for(series_id, version, severity)
+        if os.path.exists(path):
+            return path, None, 200
+
+        with self._lock:
+            future = self._pending.get(path)
+        if future is None:
+            report, status = build()
+            if status != 200:
+                return None, report, status
+            html = render_report_html(report, series_id)
+            os.makedirs(self.series_dir(series_id), exist_ok=True)
+            with self._lock:
+                future = self._pending.get(path)
+                if future is None:
+                    future = self._submit(html, path)
+                    future.add_done_callback(lambda _: self._finished(path, series_id, version))
+
+        try:
+            future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Keeps rendering in the background; a retry picks up the same render
+            raise ReportRenderTimeout()
+        return path, None, 200
+
+    def _submit(self, html, path):
+        try:
+            future = self._get_pool().submit(_write_pdf, html, path)
+        except BrokenProcessPool:
+            self._pool = None
+            future = self._get_pool().submit(_write_pdf, html, path)
+        self._pending[path] = future
+        return future
+
+    def _finished(self, path, series_id, version):
+        with self._lock:
+            self._pending.pop(path, None)
+        # Reports of older versions of this series are never served again
+        pattern = re.compile(r"report-v(\d+)-s.+\.pdf")
+        for old_path in glob.glob(os.path.join(glob.escape(self.series_dir(series_id)), "report-v*.pdf")):
+            match = pattern.fullmatch(os.path.basename(old_path))
+            if match and int(match.group(1)) != version:
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
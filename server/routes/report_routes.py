@@ -1,5 +1,6 @@
-from flask import jsonify, session, current_app, url_for
-import requests  # Use requests to call the forecast API internally
+from flask import jsonify, request, send_file, session
+from models import DEFAULT_SERIES, SERIES_ID_PATTERN, get_data_version, production_version_name
+from routes.report_pdf import ReportRenderTimeout
 from routes.utility import fetch_production_data
 
 def get_severity_label(severity):
@@ -13,56 +14,92 @@ def get_severity_label(severity):
     else:
         return 'Mixed'
 
-def init_report_routes(app):
-    @app.route('/api/report_data', methods=['GET'], endpoint='unique_report_data')
-    def get_report_data():
-        try:
-            # Fetch production data
-            production_data = fetch_production_data()
+def init_report_routes(app, forecast_service, report_renderer):
+    def build_report_data(severity_value, series_id):
+        """Report payload for a series and severity as (data, status)."""
+        # Fetch production data
+        production_data = fetch_production_data(series_id)
 
-            if production_data.empty:
-                return jsonify({'error': 'No production data available. Please upload data first.'}), 400
+        if production_data.empty:
+            return {'error': 'No production data available. Please upload data first.'}, 400
 
-            # Fetch the severity value from the session
-            severity_value = session.get('severity', 1)  # Default severity to 1 if not set
-            severity_label = get_severity_label(severity_value)  # Get severity label
-            loss_percentage = severity_value / 100  # Calculate loss percentage
+        severity_label = get_severity_label(severity_value)  # Get severity label
+        loss_percentage = severity_value / 100  # Calculate loss percentage
+
+        # Adjust production data
+        production_data['adjusted_production'] = production_data['value'] * (1 - loss_percentage)
+        production_data['loss'] = production_data['value'] * loss_percentage
 
-            # Adjust production data
-            production_data['adjusted_production'] = production_data['value'] * (1 - loss_percentage)
-            production_data['loss'] = production_data['value'] * loss_percentage
+        # Same forecast (and cache entry) as /api/forecast-losses for this severity
+        forecast_data, status = forecast_service.forecast_losses(severity_value, series_id)
 
-            # Call forecast API using Flask's internal routing
-            forecast_route = url_for('forecast_losses', _external=True)
-            forecast_response = requests.get(forecast_route)
+        if status != 200:
+            return {'error': 'Unable to fetch forecast data.'}, 500
 
-            if not forecast_response.ok:
-                return jsonify({'error': 'Unable to fetch forecast data.'}), 500
+        # Adjusted production (forecast minus the loss)
+        adjusted_production = [
+            forecast_value * (1 - loss_percentage) for forecast_value in forecast_data.get("next_8_quarters_forecast", [])
+        ]
+        
+        # Actual losses (calculated based on the loss percentage)
+        actual_losses = [
+            forecast_value * loss_percentage for forecast_value in forecast_data.get("next_8_quarters_forecast", [])
+        ]
 
-            forecast_data = forecast_response.json()
+        # Return structured data
+        return {
+            "severity_label": severity_label,
+            "severity_value": severity_value,
+            "loss_percentage": round(loss_percentage * 100, 2),
+            "data": production_data.to_dict(orient='records'),
+            "forecast_dates": forecast_data.get("forecast_dates", []),
+            "next_8_quarters_forecast": forecast_data.get("next_8_quarters_forecast", []),
+            "adjusted_production": adjusted_production,  # Updated adjusted production calculation
+            "actual_losses": actual_losses,  # Updated actual losses calculation
+        }, 200
 
-            # Adjusted production (forecast minus the loss)
-            adjusted_production = [
-                forecast_value * (1 - loss_percentage) for forecast_value in forecast_data.get("next_8_quarters_forecast", [])
-            ]
-            
-            # Actual losses (calculated based on the loss percentage)
-            actual_losses = [
-                forecast_value * loss_percentage for forecast_value in forecast_data.get("next_8_quarters_forecast", [])
-            ]
+    def requested_series():
+        series_id = request.args.get('series', DEFAULT_SERIES)
+        return series_id if SERIES_ID_PATTERN.match(series_id) else None
 
-            # Return structured data
-            report_data = {
-                "severity_label": severity_label,
-                "severity_value": severity_value,
-                "loss_percentage": round(loss_percentage * 100, 2),
-                "data": production_data.to_dict(orient='records'),
-                "next_8_quarters_forecast": forecast_data.get("next_8_quarters_forecast", []),
-                "adjusted_production": adjusted_production,  # Updated adjusted production calculation
-                "actual_losses": actual_losses,  # Updated actual losses calculation
-            }
-            return jsonify(report_data)
+    @app.route('/api/report_data', methods=['GET'], endpoint='unique_report_data')
+    def get_report_data():
+        series_id = requested_series()
+        if series_id is None:
+            return jsonify({'error': 'Invalid series id. Use letters, digits, ".", "_" or "-".'}), 400
+        try:
+            # Fetch the severity value from the session
+            severity_value = session.get('severity', 1)  # Default severity to 1 if not set
+            report_data, status = build_report_data(severity_value, series_id)
+            return jsonify(report_data), status
 
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/report.pdf', methods=['GET'])
+    def get_report_pdf():
+        series_id = requested_series()
+        if series_id is None:
+            return jsonify({'error': 'Invalid series id. Use letters, digits, ".", "_" or "-".'}), 400
+        try:
+            severity_value = session.get('severity', 1)
+            version = get_data_version(production_version_name(series_id))
+            # Rendered once per data version and severity, then served from disk
+            pdf_path, error, status = report_renderer.render(
+                series_id, version, severity_value,
+                lambda: build_report_data(severity_value, series_id)
+            )
+            if pdf_path is None:
+                return jsonify(error), status
+            return send_file(
+                pdf_path,
+                mimetype='application/pdf',
+                download_name=f'leafscan-report-{series_id}-severity-{severity_value}.pdf',
+                conditional=True,
+                max_age=0
+            )
+        except ReportRenderTimeout:
+            return jsonify({'error': 'The report is still being rendered. Please try again shortly.'}), 503
+        except Exception as e:
+            app.logger.error(f"Error rendering report PDF: {e}")
+            return jsonify({'error': str(e)}), 500
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import threading
+import time
+
+from cachetools import TTLCache
+
+from routes.image_pipeline import save_upload_async, write_upload
+
+
+def content_hash(data):
+    """SHA-256 hex digest of the uploaded image bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_checksum(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelFingerprint:
+    """Checksum of the model file, recomputed only when its size or mtime changes."""
+
+    def __init__(self, model_path, check_interval=1.0):
+        self.model_path = os.path.abspath(model_path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stat = None
+        self._checked_at = 0.0
+        self.checksum = None
+
+    def current(self):
+        now = time.monotonic()
+        with self._lock:
+            if self.checksum is not None and now - self._checked_at < self.check_interval:
+                return self.checksum
+            self._checked_at = now
+            try:
+                stat = os.stat(self.model_path)
+            except OSError:
+                # No local model file (e.g. only the model server has it)
+                self.checksum = self.checksum or "unknown"
+                return self.checksum
+            if (stat.st_size, stat.st_mtime_ns) != self._stat:
+                self._stat = (stat.st_size, stat.st_mtime_ns)
+                self.checksum = file_checksum(self.model_path)
+            return self.checksum
+
+
+class PredictionCache:
+    """LRU/TTL cache of raw model outputs keyed by image hash and model checksum."""
+
+    def __init__(self, model_path, maxsize=1024, ttl=3600):
+        self.fingerprint = ModelFingerprint(model_path)
+        self._cache = TTLCache(maxsize=max(1, int(maxsize)), ttl=ttl)
+        self._lock = threading.Lock()
+        self._model_checksum = None
+        self.hits = 0
+        self.misses = 0
+        self.inference_seconds = 0.0
+
+    def _key(self, image_hash):
+        checksum = self.fingerprint.current()
+        if checksum != self._model_checksum:
+            # A new model makes every cached prediction stale
+            self._cache.clear()
+            self._model_checksum = checksum
+        return (checksum, image_hash)
+
+    def get(self, image_hash):
+        with self._lock:
+            prediction = self._cache.get(self._key(image_hash))
+            if prediction is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return prediction
+
+    def put(self, image_hash, prediction, inference_seconds=0.0):
+        with self._lock:
+            self._cache[self._key(image_hash)] = prediction
+            self.inference_seconds += inference_seconds
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            avg_inference = self.inference_seconds / self.misses if self.misses else 0.0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._cache),
+                "avg_inference_ms": round(avg_inference * 1000, 2),
+                "estimated_cpu_seconds_saved": round(avg_inference * self.hits, 2),
+                "model_checksum": self._model_checksum,
+            }
+
+
+class ContentStore:
+    """Content-addressed storage for uploaded images.
+
+    Files are stored once under `<root>/<hash[:2]>/<hash><ext>`; the originals
+    do not depend on the model, so only predictions are tied to its checksum.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.deduplicated = 0
+
+    def path_for(self, image_hash, ext):
+        return os.path.join(self.root, image_hash[:2], f"{image_hash}{ext.lower()}")
+
+    def _is_new(self, file_path):
+        with self._lock:
+            if os.path.exists(file_path):
+                self.deduplicated += 1
+                return False
+            self.stored += 1
+            return True
+
+    def save(self, data, file_path):
+        """Write the upload now unless identical bytes are already stored."""
+        if self._is_new(file_path):
+            write_upload(data, file_path)
+
+    def save_async(self, data, file_path):
+        """Write the upload in the background unless identical bytes are already stored."""
+        if self._is_new(file_path):
+            return save_upload_async(data, file_path)
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {"stored": self.stored, "deduplicated": self.deduplicated}
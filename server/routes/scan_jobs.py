@@ -0,0 +1,152 @@
+import json
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+
+from models import db, ScanJob
+from routes.inference import InferenceUnavailable
+
+
+class ScanJobWorker:
+    """Pool of threads draining the `scan_jobs` table.
+
+    Jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so any number of
+    processes can run a pool against the same database. While a job runs its
+    `updated_at` heartbeat is refreshed every `stale_seconds / 3`; jobs left
+    `running` by a process that died are picked up again once the heartbeat
+    is stale, or failed if they already used up `max_attempts`.
+
+    A job that hits a temporary InferenceUnavailable (busy queue, model still
+    loading) is put back with `next_attempt_at` `retry_seconds` ahead and does
+    not use up an attempt.
+    """
+
+    def __init__(self, app, handler, workers=2, poll_seconds=1.0, max_attempts=3, stale_seconds=300, retry_seconds=10):
+        self.app = app
+        self.handler = handler  # handler(job) -> result dict, may add rows to db.session
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.stale_seconds = stale_seconds
+        self.retry_seconds = retry_seconds
+        self.heartbeat_seconds = max(stale_seconds / 3, 1)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """Start the worker threads once; later calls do nothing."""
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"scan-job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def notify(self):
+        """Wake idle workers after a job has been queued by this process."""
+        self._wake.set()
+
+    def _claim(self):
+        while True:
+            now = datetime.utcnow()
+            stale_before = now - timedelta(seconds=self.stale_seconds)
+            job = (
+                ScanJob.query
+                .filter(db.or_(
+                    db.and_(ScanJob.status == 'queued', db.or_(ScanJob.next_attempt_at.is_(None), ScanJob.next_attempt_at <= now)),
+                    db.and_(ScanJob.status == 'running', ScanJob.updated_at < stale_before)
+                ))
+                .order_by(ScanJob.created_at)
+                .with_for_update(skip_locked=True)
+                .first()
+            )
+            if job is None:
+                db.session.rollback()
+                return None
+
+            if job.status == 'running' and job.attempts >= self.max_attempts:
+                # Its worker died on the last attempt (e.g. the image crashed the process)
+                job.status = 'failed'
+                job.error = job.error or "Scan job worker stopped responding"
+                job.finished_at = job.updated_at = datetime.utcnow()
+                db.session.commit()
+                continue
+
+            job.status = 'running'
+            job.worker_id = self.worker_id
+            job.attempts += 1
+            job.updated_at = now
+            db.session.commit()
+            return job.id
+
+    def _heartbeat(self, job_id, stop):
+        """Refresh `updated_at` of a running job so other workers don't reclaim it."""
+        with self.app.app_context():
+            while not stop.wait(self.heartbeat_seconds):
+                try:
+                    db.session.execute(
+                        db.update(ScanJob)
+                        .where(ScanJob.id == job_id, ScanJob.status == 'running', ScanJob.worker_id == self.worker_id)
+                        .values(updated_at=datetime.utcnow())
+                    )
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.warning(f"Scan job {job_id} heartbeat failed: {e}")
+
+    def _process(self, job_id):
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, stop), name=f"scan-job-heartbeat-{job_id}", daemon=True)
+        heartbeat.start()
+        try:
+            self._run_job(job_id)
+        finally:
+            stop.set()
+            heartbeat.join()
+
+    def _run_job(self, job_id):
+        job = db.session.get(ScanJob, job_id)
+        try:
+            result = self.handler(job)
+            job.status = 'done'
+            job.result = json.dumps(result)
+            job.error = None
+            job.finished_at = job.updated_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.app.logger.error(f"Scan job {job_id} failed: {e}")
+            job = db.session.get(ScanJob, job_id)
+            job.error = str(e)
+            job.updated_at = datetime.utcnow()
+            if isinstance(e, InferenceUnavailable):
+                # The scanner is busy or loading, not a problem with this image
+                job.status = 'queued'
+                job.attempts -= 1
+                job.next_attempt_at = job.updated_at + timedelta(seconds=self.retry_seconds)
+            elif job.attempts >= self.max_attempts:
+                job.status = 'failed'
+                job.finished_at = job.updated_at
+            else:
+                job.status = 'queued'
+            db.session.commit()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    job_id = self._claim()
+                    if job_id is not None:
+                        self._process(job_id)
+                        continue
+            except Exception as e:
+                self.app.logger.error(f"Scan job worker error: {e}")
+
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
@@ -0,0 +1,125 @@
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+import threading
+
+from flask import Response, abort, request, send_file
+from werkzeug.security import safe_join
+
+# Bundler output under assets/ (Vite) or static/ (CRA) carries a content hash in its name
+HASHED_NAME = re.compile(r"^(assets|static)/.*[.-][A-Za-z0-9_]{8,}\.\w+$")
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))  # Preferred first; siblings made by precompress_static.py
+
+
+def file_etag(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+class StaticAssets:
+    """Serves the frontend build with precompressed variants and strong ETags.
+
+    Files are hashed once when indexed (the whole build at startup) and again
+    only when the (mtime, size) of the file or of its .br/.gz siblings
+    changes, so a rebuild or a later precompress run is picked up without a
+    restart while revalidations cost a few stat calls and no reads.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._files = {}
+        self.scan()
+
+    def scan(self):
+        files = {}
+        if os.path.isdir(self.root):
+            for directory, _, names in os.walk(self.root):
+                for name in names:
+                    if name.endswith((".br", ".gz")):
+                        continue
+                    path = os.path.join(directory, name)
+                    relpath = os.path.relpath(path, self.root).replace(os.sep, "/")
+                    signature = self._signature(path)
+                    if signature is not None:
+                        files[relpath] = self._index(path, signature)
+        with self._lock:
+            self._files = files
+
+    @staticmethod
+    def _signature(path):
+        """(mtime_ns, size) of the file and each sibling (None when missing), or None if no file."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        signature = [(st.st_mtime_ns, st.st_size)]
+        for _, suffix in ENCODINGS:
+            try:
+                sibling = os.stat(path + suffix)
+                signature.append((sibling.st_mtime_ns, sibling.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    @staticmethod
+    def _index(path, signature):
+        etag = file_etag(path)
+        variants = {"identity": (path, etag)}
+        for (encoding, suffix), sibling in zip(ENCODINGS, signature[1:]):
+            # A sibling older than the file is left over from the previous build
+            if sibling is not None and sibling[0] >= signature[0][0]:
+                # Each representation needs its own strong validator
+                variants[encoding] = (path + suffix, f"{etag}-{suffix[1:]}")
+        return signature, variants
+
+    def _lookup(self, relpath):
+        if relpath.endswith((".br", ".gz")):
+            return None
+        path = safe_join(self.root, relpath)
+        signature = self._signature(path) if path is not None else None
+        with self._lock:
+            entry = self._files.get(relpath)
+            if signature is None:
+                self._files.pop(relpath, None)
+                return None
+        if entry is None or entry[0] != signature:
+            # New or rebuilt since it was last indexed
+            entry = self._index(path, signature)
+            with self._lock:
+                self._files[relpath] = entry
+        return entry[1]
+
+    def serve(self, relpath):
+        variants = self._lookup(relpath)
+        if variants is None:
+            abort(404)
+
+        encoding = "identity"
+        for candidate, _ in ENCODINGS:
+            if candidate in variants and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+        path, etag = variants[encoding]
+
+        headers = {
+            "ETag": f'"{etag}"',
+            "Vary": "Accept-Encoding",
+            "Cache-Control": "public, max-age=31536000, immutable" if HASHED_NAME.match(relpath) else "no-cache",
+        }
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+
+        mimetype = mimetypes.guess_type(relpath)[0] or "application/octet-stream"
+        response = send_file(path, mimetype=mimetype, etag=False, conditional=False, max_age=None)
+        response.headers.update(headers)
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+        return response
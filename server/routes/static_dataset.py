@@ -0,0 +1,45 @@
+import os
+import threading
+import time
+
+
+class StaticDataset:
+    """A file parsed once into memory and reloaded only when its mtime or size changes.
+
+    Values derived from the data (aggregates, fitted forecasts) are memoized
+    with `derived` and dropped together with the frame on reload.
+    """
+
+    def __init__(self, path, load, check_interval=1.0):
+        self.path = path
+        self.load = load  # load(path) -> parsed data
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stat = None
+        self._checked_at = 0.0
+        self._data = None
+        self._derived = {}
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._data is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        stat = os.stat(self.path)
+        if (stat.st_size, stat.st_mtime_ns) != self._stat:
+            self._data = self.load(self.path)
+            self._derived = {}
+            self._stat = (stat.st_size, stat.st_mtime_ns)
+
+    def get(self):
+        with self._lock:
+            self._refresh()
+            return self._data
+
+    def derived(self, name, compute):
+        """Return compute(data), computed once per version of the file."""
+        with self._lock:
+            self._refresh()
+            if name not in self._derived:
+                self._derived[name] = compute(self._data)
+            return self._derived[name]
@@ -1,33 +1,64 @@
 from flask import jsonify, request, session
-from flask_mail import Message
 from models import db, User
 import random, string, os, re
-from flask_bcrypt import Bcrypt
+from routes.mail_queue import MailSender, queue_email
+from routes.password_hasher import HasherBusy, PasswordHasher
 
 # Fetch pepper from environment
 PEPPER = os.getenv("PEPPER")
 
 def init_user_routes(app, mail):  # Accept mail as a parameter
-    bcrypt = Bcrypt(app)
+    # bcrypt runs on a bounded pool so a burst of logins can't starve the scanner
+    hasher = PasswordHasher(
+        rounds=app.config.get('BCRYPT_LOG_ROUNDS', 12),
+        workers=app.config.get('PASSWORD_HASH_WORKERS'),
+        queue_depth=app.config.get('PASSWORD_HASH_QUEUE_DEPTH', 32)
+    )
+
+    # Mail is queued in the database and sent by a background sender
+    mail_sender = MailSender(
+        app,
+        mail,
+        poll_seconds=app.config.get('MAIL_QUEUE_POLL_SECONDS', 2.0),
+        batch_size=app.config.get('MAIL_QUEUE_BATCH_SIZE', 20),
+        max_attempts=app.config.get('MAIL_QUEUE_MAX_ATTEMPTS', 5),
+        backoff_seconds=app.config.get('MAIL_QUEUE_BACKOFF_SECONDS', 30)
+    )
+    if app.config.get('MAIL_QUEUE_SENDER', True):
+        # Started by the first request, so CLI processes (`flask db upgrade`,
+        # `flask send-queued-mail`) never poll a table that may not exist yet
+        @app.before_request
+        def start_mail_sender():
+            mail_sender.start()
+
+    @app.cli.command("send-queued-mail")
+    def send_queued_mail_command():
+        """Send every queued email that is due, then exit."""
+        print(f"Handled {mail_sender.drain()} queued email(s).")
+
+    @app.errorhandler(HasherBusy)
+    def hasher_busy(e):
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
 
     # Helper function for password hashing
     def hash_password(password, pepper):
-        return bcrypt.generate_password_hash(password + pepper).decode('utf-8')
+        return hasher.hash(password + pepper)
 
     def check_password(hashed_password, password, pepper):
-        return bcrypt.check_password_hash(hashed_password, password + pepper)
+        return hasher.check(hashed_password, password + pepper)
 
     def generate_verification_code():
         return ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
 
     def send_verification_email(email, code):
-        msg = Message(
+        queue_email(
             subject='Verification Code',
             sender=os.getenv('MAIL_DEFAULT_SENDER'),
-            recipients=[email]
+            recipients=[email],
+            body=f'Your verification code is: {code}'
         )
-        msg.body = f'Your verification code is: {code}'
-        mail.send(msg)  # Use the passed mail object to send the email
+        db.session.commit()
+        mail_sender.notify()
 
     # Forgot Password
     @app.route("/api/forgot_password", methods=["POST"])
@@ -50,14 +81,14 @@ def init_user_routes(app, mail):  # Accept mail as a parameter
         new_password = generate_password()
         hashed_password = hash_password(new_password, PEPPER)  # Use the hash_password function
         
+        # The new password and its email are committed together
         user.password = hashed_password
+        queue_email('Your New Password',
+                    sender=os.getenv('MAIL_USERNAME'),
+                    recipients=[email],
+                    body=f'Your new password is: {new_password}')
         db.session.commit()
-
-        msg = Message('Your New Password', 
-                      sender=os.getenv('MAIL_USERNAME'), 
-                      recipients=[email])
-        msg.body = f'Your new password is: {new_password}'
-        mail.send(msg)  # Use the passed mail object to send the email
+        mail_sender.notify()
 
         return jsonify({"message": "New password sent to your email"}), 200
 
@@ -151,6 +182,14 @@ def init_user_routes(app, mail):  # Accept mail as a parameter
         
         if not check_password(user.password, password, PEPPER):  # Use check_password with PEPPER
             return jsonify({"error": "Wrong password"}), 401
+
+        # Upgrade the stored hash when BCRYPT_LOG_ROUNDS has changed since it was made
+        if hasher.needs_rehash(user.password):
+            try:
+                user.password = hash_password(password, PEPPER)
+                db.session.commit()
+            except HasherBusy:
+                pass  # Try again on a later login
         
         if not user.is_verified:
             return jsonify({"error": "Account not verified", "user": {"id": user.id}}), 403
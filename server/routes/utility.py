@@ -1,61 +1,110 @@
-from flask import app
+from flask import current_app
+import os
+import threading
+from concurrent.futures.process import BrokenProcessPool
 import numpy as np
 import pandas as pd
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
-from sklearn.metrics import mean_absolute_error
-from sklearn.model_selection import KFold # mao ni ang gi gamit sa pag K-fold cross validation
-from sklearn.metrics import mean_squared_error
-from models import Production
-
-def time_series_k_fold(data, k=5, seasonal_periods=4):
-    # Initialize KFold (here k=5 for example)
-    kf = KFold(n_splits=k, shuffle=False)
-
-    mae_scores = []
-    mse_scores = []
-    rmse_scores = []
-
-    for train_index, test_index in kf.split(data):
-        # Split the data into train and test
-        train_data, test_data = data.iloc[train_index], data.iloc[test_index]
-
-        # Fit the model on training data
-        model = ExponentialSmoothing(
-            train_data['value'], 
-            trend='add', 
-            seasonal='add', 
-            seasonal_periods=seasonal_periods
-        ).fit()
-
-        # Forecast on the test data
-        forecast = model.forecast(len(test_data))
-
-        # Evaluate the model
-        y_true = test_data['value'].values
-        y_pred = forecast.values
-        mae = mean_absolute_error(y_true, y_pred)
-        mse = mean_squared_error(y_true, y_pred)
-        rmse = np.sqrt(mse)
-
-        mae_scores.append(mae)
-        mse_scores.append(mse)
-        rmse_scores.append(rmse)
-
-    # Return average scores from all folds
+from models import DEFAULT_SERIES, Production
+from routes.process_pool import new_process_pool
+
+_fold_pool = None
+_fold_pool_lock = threading.Lock()
+
+def get_forecast_pool():
+    """Process pool for forecast fitting (CV folds, batch jobs), created once and reused."""
+    global _fold_pool
+    with _fold_pool_lock:
+        if _fold_pool is None:
+            # Defaults to this web worker's share of the cores
+            _fold_pool = new_process_pool(int(os.getenv('FORECAST_POOL_WORKERS', 0)) or None)
+        return _fold_pool
+
+def reset_forecast_pool():
+    """Drop a broken pool so the next caller gets a fresh one."""
+    global _fold_pool
+    with _fold_pool_lock:
+        _fold_pool = None
+
+def _fit_fold(train_values, test_values, seasonal_periods):
+    """Fit one fold and return its (MAE, MSE, RMSE)."""
+    from statsmodels.tsa.holtwinters import ExponentialSmoothing
+    from sklearn.metrics import mean_absolute_error, mean_squared_error
+
+    # Fit the model on training data
+    model = ExponentialSmoothing(
+        train_values,
+        trend='add',
+        seasonal='add',
+        seasonal_periods=seasonal_periods
+    ).fit()
+
+    # Forecast on the test data and evaluate the model
+    y_pred = model.forecast(len(test_values))
+    mae = mean_absolute_error(test_values, y_pred)
+    mse = mean_squared_error(test_values, y_pred)
+    return mae, mse, np.sqrt(mse)
+
+def _fold_splits(n, k, method, seasonal_periods):
+    if method == 'walk_forward':
+        # Expanding window: every fold trains on everything before its test block,
+        # starting from the two seasons Holt-Winters needs to initialise
+        min_train = 2 * seasonal_periods
+        test_size = max(1, (n - min_train) // k)
+        splits = []
+        for i in range(k):
+            train_end = n - (k - i) * test_size
+            if train_end >= min_train:
+                splits.append((np.arange(train_end), np.arange(train_end, train_end + test_size)))
+        return splits
+
+    from sklearn.model_selection import KFold # mao ni ang gi gamit sa pag K-fold cross validation
+    return list(KFold(n_splits=k, shuffle=False).split(np.arange(n)))
+
+def time_series_k_fold(data, k=5, seasonal_periods=4, method='kfold', parallel=True):
+    """Cross-validate the Holt-Winters model on `data['value']`.
+
+    `method` is 'kfold' (unshuffled KFold) or 'walk_forward' (expanding window).
+    Folds are fitted in parallel on a shared process pool.
+    """
+    values = data['value'].to_numpy(dtype=float)
+    splits = _fold_splits(len(values), k, method, seasonal_periods)
+    args = [(values[train_index], values[test_index], seasonal_periods) for train_index, test_index in splits]
+
+    scores = None
+    if parallel and len(args) > 1:
+        try:
+            pool = get_forecast_pool()
+            scores = list(pool.map(_fit_fold, *zip(*args)))
+        except BrokenProcessPool:
+            reset_forecast_pool()
+    if scores is None:
+        scores = [_fit_fold(*fold_args) for fold_args in args]
+
+    folds = [
+        {'fold': i + 1, 'train_size': len(train), 'test_size': len(test), 'MAE': mae, 'MSE': mse, 'RMSE': rmse}
+        for i, ((train, test, _), (mae, mse, rmse)) in enumerate(zip(args, scores))
+    ]
+
+    # Return average scores from all folds along with the per-fold scores
     return {
-        'MAE': np.mean(mae_scores),
-        'MSE': np.mean(mse_scores),
-        'RMSE': np.mean(rmse_scores)
+        'MAE': float(np.mean([fold['MAE'] for fold in folds])),
+        'MSE': float(np.mean([fold['MSE'] for fold in folds])),
+        'RMSE': float(np.mean([fold['RMSE'] for fold in folds])),
+        'method': method,
+        'folds': folds
     }
     
-def fetch_production_data():
-    """Fetch production data as a DataFrame."""
+PRODUCTION_DECIMALS = 2  # Every forecast path fits on the values as rounded here
+
+def production_value(value):
+    return round(value, PRODUCTION_DECIMALS)
+
+def fetch_production_data(series_id=DEFAULT_SERIES):
+    """Fetch one production series as a DataFrame, empty when the series has no rows."""
     try:
-        records = Production.query.order_by(Production.date).all()
-        if not records:
-            raise ValueError("No production data found.")
-        data = [{'date': r.date.strftime('%Y-%m-%d'), 'value': round(r.value, 2)} for r in records]
-        return pd.DataFrame(data)
+        records = Production.query.filter_by(series_id=series_id).order_by(Production.date).all()
     except Exception as e:
-        app.logger.error(f"Error fetching production data: {e}")
-        raise
\ No newline at end of file
+        current_app.logger.error(f"Error fetching production data: {e}")
+        raise
+    data = [{'date': r.date.strftime('%Y-%m-%d'), 'value': production_value(r.value)} for r in records]
+    return pd.DataFrame(data, columns=['date', 'value'])
\ No newline at end of file
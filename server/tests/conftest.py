@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+# The server modules import each other as top-level packages (`routes`, `models`)
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Bare Flask app on a SQLite file with every table created; route modules are added per test."""
+    from flask import Flask
+    from models import db
+
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'leafscan.db'}",
+    )
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,29 @@
+import os
+import runpy
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_pool_children_do_not_build_the_app(monkeypatch, tmp_path):
+    # What forkserver/spawn children do with `python app.py` as the entry point
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'child.db'}")
+    namespace = runpy.run_path(os.path.join(SERVER_DIR, "app.py"), run_name="__mp_main__")
+
+    assert "create_app" in namespace and "app" not in namespace
+    assert not (tmp_path / "child.db").exists()
+
+
+def test_create_app_bootstraps_the_database(monkeypatch, tmp_path):
+    from models import db, DiseaseInfo
+
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'leafscan.db'}")
+    monkeypatch.setenv("SCAN_JOB_WORKERS", "0")
+    monkeypatch.setenv("STATIC_BUILD_DIR", str(tmp_path / "build"))
+    for name in ("FORECAST_CACHE_DIR", "FORECAST_MODEL_DIR", "REPORT_CACHE_DIR", "CSV_SPOOL_DIR", "SCAN_STORE_DIR"):
+        monkeypatch.setenv(name, str(tmp_path / name.lower()))
+    app = runpy.run_path(os.path.join(SERVER_DIR, "app.py"), run_name="app_factory_test")["app"]
+
+    with app.app_context():
+        assert DiseaseInfo.query.count() > 0
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,58 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from routes.inference import BatchScheduler, SchedulerBusy
+
+
+def test_concurrent_requests_share_a_batch():
+    calls = []
+
+    def predict_fn(batch):
+        calls.append(len(batch))
+        return batch.reshape(len(batch), -1).sum(axis=1, keepdims=True)
+
+    scheduler = BatchScheduler(predict_fn, max_batch_size=4, max_wait_ms=200)
+    futures = [scheduler.submit(np.full((2, 2), i, dtype=np.float32)) for i in range(4)]
+
+    results = [future.result(timeout=5)[0] for future in futures]
+    assert [float(result[0]) for result in results] == [0.0, 4.0, 8.0, 12.0]
+    assert calls == [4]
+    assert scheduler.stats()["avg_batch_size"] == 4
+
+
+def test_submit_batch_returns_rows_in_order():
+    scheduler = BatchScheduler(lambda batch: batch * 2, max_batch_size=8, max_wait_ms=1)
+    outputs, _ = scheduler.predict_batch(np.arange(3, dtype=np.float32).reshape(3, 1), timeout=5)
+    np.testing.assert_array_equal(outputs.ravel(), [0, 2, 4])
+
+
+def test_errors_reach_every_waiting_request():
+    def predict_fn(batch):
+        raise RuntimeError("model exploded")
+
+    scheduler = BatchScheduler(predict_fn, max_batch_size=2, max_wait_ms=50)
+    futures = [scheduler.submit(np.zeros(1)) for _ in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model exploded"):
+            future.result(timeout=5)
+
+
+def test_full_queue_raises_busy():
+    release = threading.Event()
+
+    def predict_fn(batch):
+        release.wait(5)
+        return batch
+
+    scheduler = BatchScheduler(predict_fn, max_batch_size=1, max_wait_ms=0, queue_depth=1)
+    try:
+        scheduler.submit(np.zeros(1))  # Taken by the worker, which then blocks
+        time.sleep(0.1)
+        scheduler.submit(np.zeros(1))  # Fills the queue
+        with pytest.raises(SchedulerBusy):
+            scheduler.submit(np.zeros(1))
+    finally:
+        release.set()
@@ -0,0 +1,160 @@
+import io
+import json
+from datetime import date
+
+import pytest
+
+from models import db, CsvImport, Production, ProductionImportRow, get_data_version, production_version_name
+from routes.csv_routes import init_csv_routes
+from routes.forecast_cache import ForecastCache
+
+
+class RecordingModelStore:
+    def __init__(self):
+        self.extended = []
+
+    def extend(self, key, old_version, new_version, new_values):
+        self.extended.append((key, old_version, new_version, new_values))
+
+
+@pytest.fixture
+def client(app, tmp_path):
+    app.config.update(SECRET_KEY="test", CSV_SPOOL_DIR=str(tmp_path / "spool"), CSV_CHUNK_ROWS=2)
+    app.model_store = RecordingModelStore()
+    init_csv_routes(app, ForecastCache(str(tmp_path / "forecasts")), app.model_store)
+    return app.test_client()
+
+
+def csv_of(rows):
+    return "Date,Production\n" + "".join(f"{day},{value}\n" for day, value in rows)
+
+
+def upload(client, text, mode=None, series="farm-a"):
+    data = {"file": (io.BytesIO(text.encode()), "production.csv"), "severity": "2"}
+    query = f"?series={series}" + (f"&mode={mode}" if mode else "")
+    return client.post(f"/api/upload_csv{query}", data=data)
+
+
+def stream(client, text):
+    """Lines of a ?mode=stream upload, decoded."""
+    response = upload(client, text, mode="stream")
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def production(series="farm-a"):
+    rows = db.session.execute(
+        db.select(Production.date, Production.value).where(Production.series_id == series).order_by(Production.date)
+    ).all()
+    return [(str(day), value) for day, value in rows]
+
+
+QUARTERS = [("2020-01-01", 10.0), ("2020-04-01", 20.0), ("2020-07-01", 30.0), ("2020-10-01", 40.0), ("2021-01-01", 50.0)]
+
+
+def interrupted_import(app, text, chunk_rows, chunks_done):
+    """Leave a half-staged import behind, as a dropped stream upload would."""
+    import hashlib
+
+    checksum = hashlib.sha256(text.encode()).hexdigest()
+    with app.app_context():
+        db.session.add(CsvImport(checksum=checksum, series_id="farm-a", chunk_rows=chunk_rows, chunks_done=chunks_done))
+        for index in range(chunks_done):
+            for day, value in QUARTERS[index * chunk_rows:(index + 1) * chunk_rows]:
+                db.session.add(ProductionImportRow(checksum=checksum, chunk=index, date=date.fromisoformat(day), value=value))
+        db.session.commit()
+    return checksum
+
+
+def test_stream_resumes_staged_chunks(app, client):
+    text = csv_of(QUARTERS)
+    interrupted_import(app, text, chunk_rows=2, chunks_done=1)
+
+    lines = stream(client, text)
+    assert lines[0]["resumed_chunks"] == 1
+    assert [line["chunk"] for line in lines if "chunk" in line] == [1, 2]
+    with app.app_context():
+        assert production() == QUARTERS
+
+
+def test_stream_restarts_when_the_chunk_size_changed(app, client):
+    text = csv_of(QUARTERS)
+    interrupted_import(app, text, chunk_rows=3, chunks_done=1)
+
+    # Skipping one 2-row chunk would lose the third quarter
+    lines = stream(client, text)
+    assert lines[0]["resumed_chunks"] == 0
+    with app.app_context():
+        assert production() == QUARTERS
+        assert db.session.get(CsvImport, lines[0]["checksum"]).chunk_rows == 2
+
+
+def test_stream_upload_is_idempotent_by_checksum(app, client):
+    text = csv_of(QUARTERS)
+    assert stream(client, text)[-1]["import"]["status"] == "done"
+    with app.app_context():
+        version = get_data_version(production_version_name("farm-a"))
+
+    response = upload(client, text, mode="stream")
+    assert response.status_code == 200
+    assert response.get_json()["message"] == "This file is already the current production data."
+    with app.app_context():
+        assert get_data_version(production_version_name("farm-a")) == version
+        assert production() == QUARTERS
+
+
+def test_every_invalid_row_is_reported_and_nothing_changes(app, client):
+    assert upload(client, csv_of(QUARTERS[:2])).status_code == 200
+
+    response = upload(client, csv_of([("2022-01-01", "n/a"), ("not a date", 5), ("2022-04-01", 7), ("2022-04-01", 8)]))
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body["error"] == "3 invalid row(s) in CSV. No data was changed."
+    assert [(row["line"], row["reason"]) for row in body["invalid_rows"]] == [
+        (2, "invalid production value"), (3, "invalid date"), (5, "duplicate date")
+    ]
+    with app.app_context():
+        assert production() == QUARTERS[:2]
+
+
+def test_stream_reports_duplicate_dates_across_chunks(app, client):
+    # 2020-01-01 lands in chunk 0 and again in chunk 1, so only the staged rows can catch it
+    lines = stream(client, csv_of(QUARTERS[:3] + [("2020-01-01", 99.0)]))
+    assert lines[-1]["invalid_rows"] == [{"date": "2020-01-01", "reason": "duplicate date"}]
+    with app.app_context():
+        assert production() == []
+        assert db.session.get(CsvImport, lines[0]["checksum"]).status == "failed"
+
+
+def test_upsert_reports_inserted_updated_and_unchanged_dates(app, client):
+    assert upload(client, csv_of(QUARTERS[:3])).status_code == 200
+
+    response = upload(client, csv_of([("2020-01-01", 10.0), ("2020-04-01", 25.0), ("2021-01-01", 50.0)]), mode="upsert")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body["inserted"], body["updated"], body["unchanged"]) == (["2021-01-01"], ["2020-04-01"], ["2020-01-01"])
+    with app.app_context():
+        assert production() == [("2020-01-01", 10.0), ("2020-04-01", 25.0), ("2020-07-01", 30.0), ("2021-01-01", 50.0)]
+    # A changed past quarter means a refit, not an extension
+    assert app.model_store.extended == []
+
+
+def test_upsert_without_changes_keeps_the_data_version(app, client):
+    upload(client, csv_of(QUARTERS))
+    with app.app_context():
+        version = get_data_version(production_version_name("farm-a"))
+
+    body = upload(client, csv_of(QUARTERS), mode="upsert").get_json()
+    assert body["message"] == "No changes. Production data is already up to date."
+    assert len(body["unchanged"]) == len(QUARTERS)
+    with app.app_context():
+        assert get_data_version(production_version_name("farm-a")) == version
+
+
+def test_appending_quarters_extends_the_stored_model(app, client):
+    upload(client, csv_of(QUARTERS[:4]))
+    with app.app_context():
+        version = get_data_version(production_version_name("farm-a"))
+
+    body = upload(client, csv_of([("2021-01-01", 50.004), ("2021-04-01", 60.0)]), mode="upsert").get_json()
+    assert body["inserted"] == ["2021-01-01", "2021-04-01"]
+    assert app.model_store.extended == [("production-farm-a", version, version + 1, [50.0, 60.0])]
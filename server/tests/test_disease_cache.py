@@ -0,0 +1,30 @@
+from models import DISEASE_INFO_VERSION, DiseaseInfo, bump_data_version, db, get_data_version
+from routes.disease_cache import DiseaseInfoCache
+
+
+def test_seeding_bumps_the_version_only_when_rows_are_added(app):
+    with app.app_context():
+        DiseaseInfo.seed()
+        assert get_data_version(DISEASE_INFO_VERSION) == 1
+        DiseaseInfo.seed()
+        assert get_data_version(DISEASE_INFO_VERSION) == 1
+
+
+def test_etag_follows_the_content(app):
+    with app.app_context():
+        cache = DiseaseInfoCache(check_interval=0)
+        empty_etag, items, _ = cache.snapshot()
+        assert items == []
+
+        DiseaseInfo.seed()
+        seeded_etag, items, by_name = cache.snapshot()
+        assert seeded_etag != empty_etag
+        assert "Cacao Leaf Spot" in by_name
+
+        disease = DiseaseInfo.query.filter_by(name="Cacao Leaf Spot").first()
+        disease.cause = "Updated by hand"
+        bump_data_version(DISEASE_INFO_VERSION)
+        db.session.commit()
+        edited_etag, _, by_name = cache.snapshot()
+        assert edited_etag != seeded_etag
+        assert by_name["Cacao Leaf Spot"]["cause"] == "Updated by hand"
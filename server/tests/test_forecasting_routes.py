@@ -0,0 +1,57 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+pytest.importorskip("statsmodels")
+
+from models import db, Production, bump_data_version, production_version_name
+from routes.batch_forecast import BatchForecaster, series_model_key
+from routes.forecast_cache import ForecastCache
+from routes.forecast_service import ForecastService
+from routes.forecasting_routes import init_forecasting_routes
+from routes.holt_winters import HoltWintersStore
+
+
+@pytest.fixture
+def client(app, tmp_path):
+    model_store = HoltWintersStore(str(tmp_path / "models"))
+    service = ForecastService(app, ForecastCache(str(tmp_path / "forecasts")), model_store)
+    init_forecasting_routes(app, service)
+    app.model_store = model_store
+    return app.test_client()
+
+
+def add_series(series_id, quarters=16, seed=3):
+    rng = np.random.default_rng(seed)
+    for i in range(quarters):
+        # Three decimals, so rounding to two changes the fitted input
+        value = 500 + 5 * i + [30, -15, 5, -20][i % 4] + rng.normal(0, 4)
+        db.session.add(Production(date(2018 + i // 4, 3 * (i % 4) + 1, 1), round(value, 3), series_id))
+    bump_data_version(production_version_name(series_id))
+    db.session.commit()
+
+
+def test_unknown_series_is_a_404(client):
+    response = client.get("/api/series/nowhere/forecast")
+    assert response.status_code == 404
+
+
+def test_production_losses_without_data_is_a_400(client):
+    response = client.get("/api/production-losses?series=nowhere")
+    assert response.status_code == 400
+
+
+def test_batch_job_stores_the_state_the_route_would_fit(app, client):
+    with app.app_context():
+        add_series("farm-a")
+    route_forecast = client.get("/api/series/farm-a/forecast?steps=4").get_json()["forecast"]
+
+    with app.app_context():
+        # Refit on the forecast pool and compare with the state the route stored
+        stored = app.model_store.get(series_model_key("farm-a"), 1).forecast(4)
+        summary = BatchForecaster(app, app.model_store).run(["farm-a"], force=True)
+    assert summary["fitted"] == 1
+    refit = app.model_store.get(series_model_key("farm-a"), 1).forecast(4)
+    np.testing.assert_allclose(refit, stored, rtol=1e-9)
+    np.testing.assert_allclose(np.round(refit, 2), route_forecast)
@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("statsmodels")
+from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
+from routes.holt_winters import HoltWintersState, HoltWintersStore
+CACAO_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Cacao Production (DDN).csv")
+
+
+def synthetic_quarters(n=48, seed=7):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    return 500 + 4.5 * t + np.tile([35.0, -20.0, 10.0, -25.0], n // 4) + rng.normal(0, 6, n)
+
+
+def cacao_quarters():
+    if not os.path.exists(CACAO_CSV):
+        pytest.skip("Cacao Production (DDN).csv is not in the checkout")
+    return pd.read_csv(CACAO_CSV)["Production"].to_numpy(dtype=float)
+
+
+@pytest.fixture(params=["synthetic", "cacao_csv"])
+def values(request):
+    return synthetic_quarters() if request.param == "synthetic" else cacao_quarters()
+
+
+def statsmodels_fit(values, **fit_kwargs):
+    return ExponentialSmoothing(values, trend="add", seasonal="add", seasonal_periods=4).fit(**fit_kwargs)
+
+
+def test_fitted_state_forecasts_like_statsmodels(values):
+    state = HoltWintersState.fit(values)
+    expected = statsmodels_fit(values).forecast(8)
+    np.testing.assert_allclose(state.forecast(8), expected, rtol=1e-8)
+
+
+def test_extended_state_matches_statsmodels_with_the_same_parameters(values):
+    # The upsert path fits once, then folds appended quarters into the stored state
+    head, tail = values[:-6], values[-6:]
+    fitted = statsmodels_fit(head)
+    state = HoltWintersState.fit(head).extend(tail)
+
+    params = fitted.params
+    reference = ExponentialSmoothing(
+        values,
+        trend="add",
+        seasonal="add",
+        seasonal_periods=4,
+        initialization_method="known",
+        initial_level=params["initial_level"],
+        initial_trend=params["initial_trend"],
+        initial_seasonal=params["initial_seasons"],
+    ).fit(
+        smoothing_level=params["smoothing_level"],
+        smoothing_trend=params["smoothing_trend"],
+        smoothing_seasonal=params["smoothing_seasonal"],
+        optimized=False,
+    )
+    np.testing.assert_allclose(state.forecast(8), reference.forecast(8), rtol=1e-8)
+
+
+def test_batched_update_matches_one_update_per_scenario():
+    state = HoltWintersState.fit(synthetic_quarters())
+    scenarios = np.array([400.0, 650.0, 900.0])
+
+    batched = state.update(scenarios).forecast(8)
+    for i, value in enumerate(scenarios):
+        np.testing.assert_allclose(batched[i], state.update(value).forecast(8))
+
+
+def test_store_round_trips_states_and_extends_versions(tmp_path):
+    values = synthetic_quarters()
+    store = HoltWintersStore(str(tmp_path))
+    state = store.get_or_fit("series-default", 1, values[:-2])
+
+    # A fresh store (another worker) reads the same state from disk
+    reloaded = HoltWintersStore(str(tmp_path)).get("series-default", 1)
+    np.testing.assert_allclose(reloaded.forecast(8), state.forecast(8))
+
+    extended = store.extend("series-default", 1, 2, values[-2:])
+    np.testing.assert_allclose(store.get("series-default", 2).forecast(8), extended.forecast(8))
+    assert store.extend("series-default", 5, 6, values[-2:]) is None
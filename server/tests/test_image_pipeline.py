@@ -0,0 +1,36 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from routes.image_pipeline import IMAGE_SIZE, decode_image, preprocess_input
+
+MEAN_BGR = np.array([103.939, 116.779, 123.68], dtype=np.float32)
+
+
+def legacy_input(data):
+    """The pre-pipeline path: PIL resize, drop alpha, keras "caffe" preprocessing."""
+    image = np.array(Image.open(io.BytesIO(data)).resize((224, 224)))
+    if image.shape[2] == 4:
+        image = image[..., :3]
+    return image.astype(np.float32)[..., ::-1] - MEAN_BGR
+
+
+def encoded(mode, fmt, size=(640, 480), seed=0):
+    rng = np.random.default_rng(seed)
+    channels = len(mode)
+    # Smooth gradients plus noise, closer to a leaf photo than pure noise
+    y, x = np.mgrid[0:size[1], 0:size[0]]
+    base = np.stack([(x * 255 / size[0]), (y * 255 / size[1]), ((x + y) % 256)] + [np.full(x.shape, 180)] * (channels - 3), axis=-1)
+    pixels = np.clip(base + rng.normal(0, 20, base.shape), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels, mode).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("mode, fmt", [("RGB", "JPEG"), ("RGB", "PNG"), ("RGBA", "PNG")])
+def test_decoded_input_matches_the_original_pipeline(mode, fmt):
+    data = encoded(mode, fmt)
+    out = np.empty(IMAGE_SIZE + (3,), dtype=np.float32)
+    np.testing.assert_array_equal(decode_image(data, preprocess_input, out=out), legacy_input(data))
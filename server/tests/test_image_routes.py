@@ -0,0 +1,65 @@
+import io
+import threading
+import zipfile
+
+import pytest
+
+
+@pytest.fixture
+def client(app, tmp_path):
+    from routes.image_routes import init_image_routes
+
+    app.config.update(
+        SCAN_STORE_DIR=str(tmp_path / "scans"),
+        SCAN_JOB_WORKERS=0,
+        BULK_SCAN_MAX_IMAGES=3,
+        MAX_IMAGE_BYTES=1024,
+    )
+    init_image_routes(app)
+    return app.test_client()
+
+
+def zip_of(names, size=10):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as bundle:
+        for name in names:
+            bundle.writestr(name, b"x" * size)
+    buffer.seek(0)
+    return buffer
+
+
+def test_upload_image_rejects_oversized_files(client):
+    response = client.post("/api/upload_image", data={"image": (io.BytesIO(b"x" * 1025), "leaf.jpg")})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Image is too large"}
+
+
+def test_bulk_upload_limits_match_for_multipart_and_zip(client):
+    files = [(io.BytesIO(b"x" * 10), f"leaf{i}.jpg") for i in range(5)]
+    multipart = client.post("/api/upload_images", data={"images": files})
+    archive = client.post("/api/upload_images", data={"archive": (zip_of([f"leaf{i}.jpg" for i in range(5)]), "leaves.zip")})
+
+    assert multipart.status_code == archive.status_code == 400
+    assert multipart.get_json() == archive.get_json() == {"error": "At most 3 images can be scanned per request"}
+
+
+def test_bulk_upload_rejects_oversized_zip_members(client):
+    response = client.post("/api/upload_images", data={"archive": (zip_of(["big.png"], size=2048), "leaves.zip")})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "big.png is too large"}
+
+
+def test_background_work_waits_for_the_first_request(app, tmp_path):
+    from routes.image_routes import init_image_routes
+
+    def job_threads():
+        return [thread for thread in threading.enumerate() if thread.name.startswith("scan-job-worker")]
+
+    app.config.update(SCAN_STORE_DIR=str(tmp_path / "scans"), SCAN_JOB_WORKERS=1, SCAN_JOB_POLL_SECONDS=60, MODEL_PATH=str(tmp_path / "missing.h5"))
+    before = len(job_threads())
+    init_image_routes(app)
+    assert len(job_threads()) == before  # e.g. `flask db upgrade` only builds the app
+
+    health = app.test_client().get("/api/model_health").get_json()
+    assert health["in_process_model"]["status"] != "idle"
+    assert len(job_threads()) == before + 1
@@ -0,0 +1,135 @@
+import json
+import socket
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller
+from flask_mail import Mail
+
+from models import OutboundEmail, db
+from routes.mail_queue import MailSender, queue_email
+
+
+class RecordingHandler:
+    """aiosmtpd handler that keeps delivered messages and refuses chosen recipients."""
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+        self.refuse = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refuse:
+            return "550 Mailbox unavailable"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append((envelope.rcpt_tos, envelope.content.decode("utf-8", "replace")))
+        return "250 Message accepted"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp():
+    handler = RecordingHandler()
+    handler.port = free_port()
+    controller = Controller(handler, hostname="127.0.0.1", port=handler.port)
+    controller.start()
+    yield handler
+    controller.stop()
+
+
+def make_sender(app, port):
+    # TESTING would otherwise make Flask-Mail suppress every send
+    app.config.update(MAIL_SERVER="127.0.0.1", MAIL_PORT=port, MAIL_USE_TLS=False, MAIL_USE_SSL=False,
+                      MAIL_SUPPRESS_SEND=False)
+    return MailSender(app, Mail(app), batch_size=2, max_attempts=3, backoff_seconds=30)
+
+
+@pytest.fixture
+def sender(app, smtp):
+    return make_sender(app, smtp.port)
+
+
+def queue(*recipients):
+    for recipient in recipients:
+        queue_email("Verify your email", "noreply@leafscan.test", [recipient], f"Code for {recipient}")
+    db.session.commit()
+
+
+def test_drain_sends_every_due_message_over_one_connection(app, smtp, sender):
+    with app.app_context():
+        queue("a@farm.test", "b@farm.test", "c@farm.test")
+        assert sender.drain() == 3
+
+        emails = OutboundEmail.query.all()
+        assert {email.status for email in emails} == {"sent"}
+        assert all(email.body is None for email in emails)  # Codes are not kept once sent
+
+    assert sorted(rcpt[0] for rcpt, _ in smtp.messages) == ["a@farm.test", "b@farm.test", "c@farm.test"]
+    assert len(smtp.sessions) == 1  # Batches of 2, but a single SMTP session
+
+
+def test_refused_message_backs_off_then_fails(app, smtp, sender):
+    smtp.refuse.add("bounce@farm.test")
+    with app.app_context():
+        queue("bounce@farm.test", "ok@farm.test")
+        started = datetime.utcnow()
+        assert sender.drain() == 2
+
+        email = OutboundEmail.query.filter_by(recipients=json.dumps(["bounce@farm.test"])).one()
+        assert email.status == "queued"
+        assert email.attempts == 1
+        assert email.last_error
+        assert email.next_attempt_at >= started + timedelta(seconds=30)
+
+        # Not due yet, so nothing is retried
+        assert sender.drain() == 0
+
+        for expected_delay in (60, None):
+            email.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+            db.session.commit()
+            retried_at = datetime.utcnow()
+            assert sender.drain() == 1
+            email = db.session.get(OutboundEmail, email.id)
+            if expected_delay:
+                assert email.status == "queued"
+                assert email.next_attempt_at >= retried_at + timedelta(seconds=expected_delay)
+
+        assert email.status == "failed"
+        assert email.attempts == 3
+        assert email.body is None
+
+    assert [rcpt for rcpt, _ in smtp.messages] == [["ok@farm.test"]]
+
+
+def test_unreachable_server_reschedules_claimed_messages(app):
+    sender = make_sender(app, free_port())  # Nothing listens there
+    with app.app_context():
+        queue("a@farm.test")
+        assert sender.drain() == 0
+        email = OutboundEmail.query.one()
+        assert email.status == "queued"
+        assert email.attempts == 1
+        assert email.next_attempt_at > datetime.utcnow()
+
+
+def test_sender_thread_starts_with_the_first_request(app):
+    from routes.user_routes import init_user_routes
+
+    app.config.update(MAIL_QUEUE_SENDER=True, MAIL_QUEUE_POLL_SECONDS=60)
+    init_user_routes(app, Mail(app))
+    assert not any(thread.name == "mail-sender" for thread in threading.enumerate())
+
+    app.test_client().get("/api/does-not-exist")
+    assert any(thread.name == "mail-sender" for thread in threading.enumerate())
@@ -0,0 +1,54 @@
+import time
+
+import numpy as np
+import pytest
+
+from routes.inference import ModelWarmup, ScannerNotReady
+
+
+class FakeScheduler:
+    def predict(self, image):
+        return np.zeros(7), 0.0
+
+    def stats(self):
+        return {}
+
+
+def test_warmup_reports_ready_after_a_dummy_inference():
+    warmup = ModelWarmup(FakeScheduler, input_shape=(2, 2, 3))
+    assert isinstance(warmup.get(timeout=5), FakeScheduler)
+    assert warmup.stats()["status"] == "ready"
+
+
+def test_failed_load_is_not_retried_during_the_cooldown():
+    attempts = []
+
+    def load():
+        attempts.append(time.monotonic())
+        raise ValueError("weights missing")
+
+    warmup = ModelWarmup(load, retry_seconds=60)
+    with pytest.raises(ScannerNotReady, match="weights missing"):
+        warmup.get(timeout=5)
+    for _ in range(5):
+        with pytest.raises(ScannerNotReady):
+            warmup.get(timeout=5)
+    assert len(attempts) == 1
+    assert warmup.stats()["retry_in_seconds"] > 0
+
+
+def test_failed_load_is_retried_after_the_cooldown():
+    attempts = []
+
+    def load():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ValueError("flaky disk")
+        return FakeScheduler()
+
+    warmup = ModelWarmup(load, input_shape=(2, 2, 3), retry_seconds=0.05)
+    with pytest.raises(ScannerNotReady):
+        warmup.get(timeout=5)
+    time.sleep(0.1)
+    assert isinstance(warmup.get(timeout=5), FakeScheduler)
+    assert warmup.failures == 0
@@ -0,0 +1,30 @@
+import os
+
+from routes.report_pdf import ReportRenderer
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+
+
+def test_cleanup_only_removes_older_versions_of_the_same_series(tmp_path):
+    renderer = ReportRenderer(str(tmp_path))
+    # "farm" and "farm-v1-s2" used to share the report-farm-v*.pdf glob
+    old = renderer.path_for("farm", 1, 5)
+    current = renderer.path_for("farm", 2, 5)
+    other = renderer.path_for("farm-v1-s2", 1, 5)
+    for path in (old, current, other):
+        touch(path)
+
+    renderer._finished(current, "farm", 2)
+
+    assert not os.path.exists(old)
+    assert os.path.exists(current)
+    assert os.path.exists(other)
+
+
+def test_dot_series_ids_stay_inside_the_cache_root(tmp_path):
+    renderer = ReportRenderer(str(tmp_path / "reports"))
+    path = os.path.realpath(renderer.path_for("..", 1, 5))
+    assert path.startswith(os.path.realpath(tmp_path / "reports") + os.sep)
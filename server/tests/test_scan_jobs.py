@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+from models import db, ScanJob
+from routes.inference import ScannerNotReady
+from routes.scan_jobs import ScanJobWorker
+
+
+def queue_job():
+    job = ScanJob(image_path="leaf.jpg", image_hash="0" * 64)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_unavailable_scanner_defers_without_using_an_attempt(app):
+    def handler(job):
+        raise ScannerNotReady("Model is still loading")
+
+    worker = ScanJobWorker(app, handler, max_attempts=1, retry_seconds=30)
+    with app.app_context():
+        job_id = queue_job()
+        for _ in range(3):
+            claimed = worker._claim()
+            if claimed is None:
+                break
+            worker._run_job(claimed)
+
+        job = db.session.get(ScanJob, job_id)
+        assert claimed is None  # Deferred, so not claimable again right away
+        assert (job.status, job.attempts) == ("queued", 0)
+        assert job.next_attempt_at > datetime.utcnow() + timedelta(seconds=20)
+
+
+def test_handler_errors_use_up_attempts(app):
+    def handler(job):
+        raise ValueError("cannot identify image file")
+
+    worker = ScanJobWorker(app, handler, max_attempts=2)
+    with app.app_context():
+        job_id = queue_job()
+        while (claimed := worker._claim()) is not None:
+            worker._run_job(claimed)
+
+        job = db.session.get(ScanJob, job_id)
+        assert (job.status, job.attempts, job.error) == ("failed", 2, "cannot identify image file")
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from models import (
+    ScanDailyCount, ScanDiseaseCount, ScanRecord, ScanUserCount, User, backfill_scan_rollups, db,
+    record_scan_rollups
+)
+
+
+def add_scans(user_id, diseases, created_at):
+    for disease in diseases:
+        db.session.add(ScanRecord(image_path="x.jpg", disease=disease, user_id=user_id, created_at=created_at))
+    record_scan_rollups([(user_id, disease, created_at) for disease in diseases])
+
+
+def rollups():
+    return (
+        {row.disease: row.count for row in ScanDiseaseCount.query},
+        {(str(row.day), row.user_id): row.count for row in ScanDailyCount.query},
+    )
+
+
+def test_deleting_a_user_takes_their_scans_out_of_the_rollups(app):
+    with app.app_context():
+        db.session.execute(db.text("PRAGMA foreign_keys=ON"))
+        alice = User(name="Alice", email="alice@farm.test", password="x")
+        bob = User(name="Bob", email="bob@farm.test", password="x")
+        db.session.add_all([alice, bob])
+        db.session.flush()
+        add_scans(alice.id, ["Cacao Leaf Spot", "Cacao Leaf Spot", "Cacao Late Blight"], datetime(2024, 5, 1, 9))
+        add_scans(bob.id, ["Cacao Leaf Spot"], datetime(2024, 5, 1, 10))
+        db.session.commit()
+
+        db.session.delete(alice)
+        db.session.commit()
+
+        assert ScanRecord.query.count() == 1
+        incremental = rollups()
+        assert incremental == ({"Cacao Leaf Spot": 1}, {("2024-05-01", bob.id): 1})
+        assert {row.user_id for row in ScanUserCount.query} == {bob.id}
+
+        backfill_scan_rollups()
+        assert rollups() == incremental
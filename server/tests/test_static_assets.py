@@ -0,0 +1,89 @@
+import gzip
+import os
+
+import pytest
+
+brotli = pytest.importorskip("brotli")
+from flask import Flask
+
+from precompress_static import precompress
+from routes.static_assets import StaticAssets
+
+BUNDLE = "assets/index-3f9a1c2b.js"
+
+
+def write(root, relpath, text):
+    path = os.path.join(root, relpath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+    return path
+
+
+@pytest.fixture
+def build(tmp_path):
+    root = str(tmp_path / "build")
+    write(root, "index.html", f'<script src="/{BUNDLE}"></script>' + "<!-- padding -->" * 200)
+    write(root, BUNDLE, "console.log('leafscan');\n" * 200)
+    precompress(root)
+    return root
+
+
+@pytest.fixture
+def client(build):
+    app = Flask(__name__)
+    assets = StaticAssets(build)
+    app.add_url_rule("/", "index", lambda: assets.serve("index.html"))
+    app.add_url_rule("/<path:filename>", "asset", lambda filename: assets.serve(filename))
+    return app.test_client()
+
+
+def test_negotiates_precompressed_variants(client):
+    br = client.get(f"/{BUNDLE}", headers={"Accept-Encoding": "gzip, br"})
+    assert br.headers["Content-Encoding"] == "br"
+    assert brotli.decompress(br.data).startswith(b"console.log")
+
+    gz = client.get(f"/{BUNDLE}", headers={"Accept-Encoding": "gzip"})
+    assert gz.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(gz.data).startswith(b"console.log")
+
+    plain = client.get(f"/{BUNDLE}")
+    assert "Content-Encoding" not in plain.headers
+    assert plain.data.startswith(b"console.log")
+    assert len({br.headers["ETag"], gz.headers["ETag"], plain.headers["ETag"]}) == 3
+    assert plain.headers["Vary"] == "Accept-Encoding"
+
+
+def test_hashed_bundles_are_immutable_and_html_revalidates(client):
+    assert "immutable" in client.get(f"/{BUNDLE}").headers["Cache-Control"]
+    assert client.get("/").headers["Cache-Control"] == "no-cache"
+
+
+def test_matching_etag_gets_a_304(client):
+    etag = client.get("/").headers["ETag"]
+    response = client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+
+def test_rebuild_without_restart_changes_the_etag(client, build):
+    old_etag = client.get("/", headers={"Accept-Encoding": "br"}).headers["ETag"]
+
+    # New bundle name; the stale .br/.gz of index.html must not be served
+    write(build, "index.html", '<script src="/assets/index-9d8e7f6a.js"></script>')
+    os.utime(os.path.join(build, "index.html"), ns=(1, os.stat(os.path.join(build, "index.html.br")).st_mtime_ns + 1))
+    response = client.get("/", headers={"Accept-Encoding": "br", "If-None-Match": old_etag})
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+    assert b"index-9d8e7f6a.js" in response.data
+
+    # Precompressing afterwards is picked up as well
+    write(build, "index.html", '<script src="/assets/index-9d8e7f6a.js"></script>' + "<!-- padding -->" * 200)
+    precompress(build)
+    assert client.get("/", headers={"Accept-Encoding": "br"}).headers["Content-Encoding"] == "br"
+
+
+def test_missing_files_and_escapes_are_404s(client):
+    assert client.get("/nope.js").status_code == 404
+    assert client.get("/index.html.br").status_code == 404
+    assert client.get("/../secrets.txt").status_code == 404